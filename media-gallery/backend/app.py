@@ -1,12 +1,44 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import (Flask, request, jsonify, make_response, abort, stream_with_context, g, has_request_context,
+                   send_file)
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, table, column
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.wsgi import get_input_stream
 import os
-from datetime import datetime
+import atexit
+import cProfile
+import random
+import shutil
+import sqlite3
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+from concurrent.futures import ProcessPoolExecutor
 import uuid
+import json
+from urllib.parse import quote
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
+from click_buffer import ClickBuffer
+from catalog_version import CatalogVersion
+from db_writer import DbWriter
+from periodic_task import PeriodicTask
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from request_profiler import ProfileStore
+from tracing import JsonlExporter, Tracer
+from response_cache import ResponseCache
+from file_serving import send_file_ranged, guess_mimetype
+from multipart_stream import HashingFileWriter, read_multipart
+from media_serializer import (MEDIA_FIELDS, STREAM_CHUNK_SIZE, MediaSerializer, json_response,
+                              stream_json, stream_ndjson)
+from search_index import BM25_WEIGHTS, create_search_index, split_query, like_pattern
+from thumbnails import THUMBNAIL_SIZES, THUMBNAIL_FORMATS, thumbnail_name, thumbnails_exist, generate_thumbnails
 
 app = Flask(__name__)
 CORS(app)
@@ -16,14 +48,245 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'C:/agent/media-gallery/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
 app.config['SECRET_KEY'] = 'your-secret-key-here-change-in-production'  # 用于session管理
+app.config['CLICK_FLUSH_INTERVAL'] = 5  # 点击计数缓冲写库间隔（秒）
+app.config['CLICK_FLUSH_THRESHOLD'] = 500  # 缓冲点击数达到该值时立即写库
+app.config['THUMBNAIL_WORKERS'] = 2  # 缩略图生成进程数
+app.config['USE_SENDFILE'] = True  # 通过wsgi.file_wrapper发送文件（gunicorn下为sendfile零拷贝）
+app.config['X_ACCEL_REDIRECT_PREFIX'] = None  # 例如'/protected-uploads/'，设置后由nginx发送文件内容
+app.config['RESUMABLE_MAX_SIZE'] = 20 * 1024 * 1024 * 1024  # 断点续传单个文件上限（20GB）
+app.config['RESUMABLE_SESSION_TTL'] = 24 * 3600  # 断点续传会话超过该秒数没有收到分块即视为放弃，删除会话和临时文件
+app.config['UPLOAD_CLEANUP_INTERVAL'] = 3600  # Web进程清理过期上传会话的间隔（秒），0为关闭
+app.config['CATALOG_VERSION_DIR'] = os.path.join(app.instance_path, 'catalog_version')  # 多进程共享的版本号文件目录
+app.config['JOB_QUEUE_ENABLED'] = False  # 为True时缩略图等后续处理写入job表，由worker.py进程执行
+app.config['JOB_VISIBILITY_TIMEOUT'] = 300  # 任务被领取后超过该秒数未完成，视为worker失联重新可见
+app.config['JOB_MAX_ATTEMPTS'] = 3
+app.config['SEARCH_CLICK_WEIGHT'] = 0.5  # 搜索排序中点击数的加成上限（相关度最多放大1.5倍）
+app.config['SEARCH_CLICK_HALF'] = 50  # 点击数达到该值时获得一半加成
+app.config['STATS_TAG_LIMIT'] = 100  # /api/stats返回的标签分布条数
+app.config['STATS_MAX_DAYS'] = 365  # /api/stats按天统计上传数的最大天数
+app.config['BATCH_MAX_IDS'] = 300  # /api/media/batch单次最多获取的媒体数
+app.config['BULK_UPLOAD_MAX_SIZE'] = 5 * 1024 * 1024 * 1024  # 批量上传单个请求上限（5GB），单个文件仍受MAX_CONTENT_LENGTH限制
+app.config['BULK_UPLOAD_MAX_FILES'] = 1000
+app.config['BULK_DELETE_MAX_IDS'] = 1000
+app.config['RESPONSE_CACHE_SIZE'] = 512  # 只读目录接口响应缓存的最大条目数，0为关闭
+app.config['RESPONSE_CACHE_TTL'] = 30  # 缓存条目最长保留秒数（数据变化时按版本号立即失效）
+app.config['RESPONSE_CACHE_MAX_BODY'] = 1024 * 1024  # 超过该大小的响应不缓存
+app.config['DB_WRITER_MAX_BATCH'] = 64  # 写线程一个事务最多合并的写操作数
+app.config['DB_WRITER_MAX_WAIT'] = 0.002  # 写线程收集同批写操作的等待时间（秒）
+app.config['HOT_HALF_LIFE_HOURS'] = 24  # 热度分的半衰期：点击每过该小时数权重减半
+app.config['HOT_WINDOW_HOURS'] = 168  # 只统计最近7天的点击，更早的分时点击记录被清理
+app.config['HOT_SCORE_INTERVAL'] = 600  # Web进程重新计算热度分的间隔（秒），0为关闭，可改用update_hot_scores.py定时执行
+app.config['SQLITE_BUSY_TIMEOUT'] = 5000  # 其他进程（worker.py、维护脚本）持有写锁时的等待毫秒数
+app.config['METRICS_ENABLED'] = True  # 是否提供GET /metrics
+app.config['PROFILE_DIR'] = os.path.join(app.instance_path, 'profiles')  # 请求剖析结果（pstats和折叠栈）目录
+app.config['PROFILE_MAX_ENTRIES'] = 50  # 最多保留的剖析记录数，超出时删除最旧的
+app.config['PROFILE_SAMPLE_RATE'] = 0  # 每N个请求随机剖析一个，0为关闭；管理员也可对单个请求加?__profile=1
+app.config['TRACING_ENABLED'] = False  # 记录请求各阶段的span；span在请求线程中同步写文件，默认关闭
+# span输出文件，按大小轮转；{pid}替换为进程号，多个worker各写各的文件
+app.config['TRACE_FILE'] = os.path.join(app.instance_path, 'traces', 'spans-{pid}.jsonl')
+app.config['TRACE_MAX_BYTES'] = 10 * 1024 * 1024
+app.config['TRACE_BACKUP_COUNT'] = 5
+app.config['TRACE_SAMPLE_RATE'] = 0.01  # 记录span的请求比例，未抽中的请求仍返回trace id
+app.config['SERVER_TIMING'] = False  # 为True（或debug模式）时响应带Server-Timing头：总耗时、SQL耗时和语句数
+# 环境变量MEDIA_GALLERY_SETTINGS指向的Python配置文件可覆盖以上配置（如基准测试使用独立的数据库和上传目录）
+app.config.from_envvar('MEDIA_GALLERY_SETTINGS', silent=True)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov', 'wmv'}
 
 db = SQLAlchemy(app)
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL模式下读不阻塞写、写不阻塞读；synchronous=NORMAL在WAL下仍保证数据库一致"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT'])}")
+    cursor.close()
+
+# 所有请求中的写操作交给单个写线程合并提交
+db_writer = DbWriter(
+    app, db,
+    max_batch=app.config['DB_WRITER_MAX_BATCH'],
+    max_wait=app.config['DB_WRITER_MAX_WAIT']
+)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'admin_login'
 
+# 目录数据版本号：上传、删除、点击写库、设置修改后递增，用于生成ETag
+catalog_version = CatalogVersion(app.config['CATALOG_VERSION_DIR'])
+
+# 只读目录接口的响应缓存，条目以ETag校验，版本号变化后自动失效
+response_cache = ResponseCache(
+    max_entries=app.config['RESPONSE_CACHE_SIZE'],
+    ttl=app.config['RESPONSE_CACHE_TTL'],
+    max_body_size=app.config['RESPONSE_CACHE_MAX_BODY']
+)
+
+# 请求、SQL和上传指标，GET /metrics以Prometheus文本格式输出
+metrics = MetricsRegistry()
+request_latency = metrics.histogram(
+    'http_request_duration_seconds', 'Request latency, including streamed bodies', ('endpoint', 'method'))
+request_count = metrics.counter('http_requests_total', 'Requests by endpoint and status', ('endpoint', 'method', 'status'))
+request_queries = metrics.histogram(
+    'http_request_sql_queries', 'SQL statements executed per request', ('endpoint',),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250))
+sql_duration = metrics.histogram(
+    'sql_query_duration_seconds', 'SQL statement execution time; endpoint="background" for the writer and timer threads',
+    ('endpoint',), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+upload_bytes = metrics.counter('upload_bytes_total', 'Upload bytes received and written to disk', ('endpoint',))
+upload_duration = metrics.histogram(
+    'upload_write_duration_seconds', 'Time spent receiving, hashing and writing upload bodies', ('endpoint',))
+metrics.gauge_callback('db_writer_batches_total', 'Transactions committed by the writer thread',
+                       lambda: {(): db_writer.batches}, metric_type='counter')
+metrics.gauge_callback('db_writer_operations_total', 'Write operations committed by the writer thread',
+                       lambda: {(): db_writer.operations}, metric_type='counter')
+metrics.gauge_callback('response_cache_lookups_total', 'Response cache lookups by result',
+                       lambda: {('hit',): response_cache.hits, ('miss',): response_cache.misses},
+                       labelnames=('result',), metric_type='counter')
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query_time(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    if has_request_context():
+        endpoint = request.endpoint or 'unmatched'
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_time = g.get('sql_time', 0.0) + elapsed
+    else:
+        endpoint = 'background'
+    sql_duration.observe(elapsed, endpoint)
+
+@event.listens_for(Engine, 'handle_error')
+def discard_query_timer(exception_context):
+    # 语句执行失败时after_cursor_execute不会触发
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start_time'):
+        conn.info['query_start_time'].pop()
+
+def record_upload(nbytes, started):
+    """记录一次上传内容的接收和写盘，started为time.perf_counter()起点"""
+    endpoint = request.endpoint or 'unmatched'
+    upload_bytes.inc(endpoint, amount=nbytes)
+    upload_duration.observe(time.perf_counter() - started, endpoint)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def add_server_timing(response):
+    g.response_status = response.status_code
+    if (app.debug or app.config['SERVER_TIMING']) and 'request_start' in g:
+        total = (time.perf_counter() - g.request_start) * 1000
+        response.headers['Server-Timing'] = (
+            f"app;dur={total:.1f}, "
+            f"db;dur={g.get('sql_time', 0.0) * 1000:.1f};desc=\"queries={g.get('sql_queries', 0)}\""
+        )
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    # 流式响应的teardown在输出结束后才执行，耗时包括输出时间
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    request_latency.observe(time.perf_counter() - start, endpoint, request.method)
+    request_count.inc(endpoint, request.method, str(500 if exc else g.get('response_status', 500)))
+    request_queries.observe(g.get('sql_queries', 0), endpoint)
+
+# 请求各阶段的span，写入TRACE_FILE，用trace_summary.py统计分位数
+tracer = Tracer(
+    JsonlExporter(app.config['TRACE_FILE'], app.config['TRACE_MAX_BYTES'], app.config['TRACE_BACKUP_COUNT'])
+    if app.config['TRACING_ENABLED'] else None,
+    sample_rate=app.config['TRACE_SAMPLE_RATE']
+)
+
+@app.before_request
+def start_trace():
+    g.trace = tracer.start_trace(
+        request.endpoint or 'unmatched',
+        traceparent=request.headers.get('traceparent'),
+        trace_id=request.headers.get('X-Trace-Id'),
+        method=request.method,
+        path=request.path
+    )
+
+@app.after_request
+def add_trace_headers(response):
+    if 'trace' in g:
+        response.headers['X-Trace-Id'] = g.trace.trace_id
+        response.headers['traceparent'] = g.trace.traceparent
+    return response
+
+@app.teardown_request
+def end_trace(exc):
+    span = g.pop('trace', None)
+    if span is not None:
+        tracer.end_trace(span, status=500 if exc else g.get('response_status'))
+
+# 请求剖析结果的环形存储
+profile_store = ProfileStore(app.config['PROFILE_DIR'], app.config['PROFILE_MAX_ENTRIES'])
+
+# 不参与抽样剖析的端点（指标抓取和剖析结果本身）
+PROFILE_EXCLUDED_ENDPOINTS = {'metrics_endpoint', 'admin_list_profiles', 'admin_download_profile'}
+
+def should_profile():
+    if request.args.get('__profile') == '1' and current_user.is_authenticated:
+        return True
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    return bool(rate) and request.endpoint not in PROFILE_EXCLUDED_ENDPOINTS and random.randrange(rate) == 0
+
+@app.before_request
+def start_profiler():
+    if not should_profile():
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()  # 只剖析当前线程
+    except ValueError:
+        return  # 当前线程已有其他剖析器
+    g.profiler = profiler
+    g.profile_id = profile_store.new_id(request.endpoint)
+
+@app.after_request
+def add_profile_header(response):
+    if 'profile_id' in g:
+        response.headers['X-Profile-Id'] = g.profile_id
+    return response
+
+@app.teardown_request
+def save_profile(exc):
+    # 在记录请求指标的teardown之前执行，流式响应同样在输出结束后才停止剖析
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    try:
+        profile_store.save(g.profile_id, profiler, request.endpoint, {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': 500 if exc else g.get('response_status'),
+            'duration_ms': round((time.perf_counter() - g.request_start) * 1000, 1),
+            'sql_queries': g.get('sql_queries', 0),
+            'created_at': datetime.utcnow().isoformat()
+        })
+    except Exception as e:
+        print(f"保存剖析结果失败: {e}")
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not app.config['METRICS_ENABLED']:
+        abort(404)
+    return app.response_class(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
 class Admin(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -41,15 +304,119 @@ def load_user(user_id):
     return Admin.query.get(int(user_id))
 
 class Media(db.Model):
+    __table_args__ = (
+        # 列表按(created_at, id)倒序做游标分页
+        db.Index('ix_media_created_at_id', 'created_at', 'id'),
+        # sort=hot|popular|largest按(排序列, id)索引倒序扫描，不做内存排序
+        db.Index('ix_media_hot_score_id', 'hot_score', 'id'),
+        db.Index('ix_media_click_count_id', 'click_count', 'id'),
+        db.Index('ix_media_file_size_id', 'file_size', 'id'),
+    )
+
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)  # 'image' or 'video'
     file_path = db.Column(db.String(500), nullable=False)
     tags = db.Column(db.String(255), nullable=False)  # comma-separated tags
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # 游标分页按(created_at, id)比较，不允许为空；不经ORM插入的记录取数据库当前时间，
+    # 格式与SQLAlchemy写入的一致（带6位小数秒），否则与游标参数按字符串比较时顺序不对
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           server_default=db.text("(strftime('%Y-%m-%d %H:%M:%f', 'now') || '000')"))
     file_size = db.Column(db.Integer, nullable=False)
     click_count = db.Column(db.Integer, default=0)
+    has_thumbnails = db.Column(db.Boolean, default=False)  # 缩略图是否已生成
+    sha256 = db.Column(db.String(64), index=True)  # 内容哈希，对应blob表；旧数据为空
+    hot_score = db.Column(db.Float, nullable=False, default=0, server_default='0')  # 按小时衰减的点击热度，由refresh_hot_scores定期计算
+
+# 新建media表时一并创建全文检索索引和同步触发器，已有数据库执行migrate_search_index.py
+@event.listens_for(Media.__table__, 'after_create')
+def create_media_search_index(target, connection, **kw):
+    create_search_index(connection.exec_driver_sql)
+
+# FTS5虚拟表不属于ORM模型，只用于拼接查询
+media_fts = table('media_fts', column('rowid'), column('original_filename'), column('tags'))
+
+# 标签关联表：每个媒体的每个标签一行，排序列冗余自Media，按标签筛选时各种排序都直接按索引顺序读取
+class MediaTag(db.Model):
+    __tablename__ = 'media_tag'
+    __table_args__ = (
+        db.Index('ix_media_tag_tag_created_at', 'tag', 'created_at', 'media_id'),
+        db.Index('ix_media_tag_tag_hot_score', 'tag', 'hot_score', 'media_id'),
+        db.Index('ix_media_tag_tag_click_count', 'tag', 'click_count', 'media_id'),
+        db.Index('ix_media_tag_tag_file_size', 'tag', 'file_size', 'media_id'),
+    )
+
+    media_id = db.Column(db.String(36), db.ForeignKey('media.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    # 与Media同名列保持一致：点击写库和热度分计算时一并更新
+    hot_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    click_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    file_size = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+# 标签统计表：随上传、删除、点击增量维护，/api/tags直接按weight索引读取
+class TagStat(db.Model):
+    __tablename__ = 'tag_stats'
+
+    tag = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+    weight = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+# 分时点击统计：每个媒体每小时一行，用于计算随时间衰减的热度分，超出HOT_WINDOW_HOURS的行被定期清理
+class ClickBucket(db.Model):
+    __tablename__ = 'click_bucket'
+    __table_args__ = (
+        db.Index('ix_click_bucket_hour', 'hour'),
+    )
+
+    media_id = db.Column(db.String(36), db.ForeignKey('media.id', ondelete='CASCADE'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)  # UTC整点
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# 按内容寻址的文件块：相同内容只存一份（images|videos/<sha256>.<ext>），多个Media共享并按引用计数删除
+class Blob(db.Model):
+    __tablename__ = 'blob'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    file_size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# 后台任务队列：status为queued/running且available_at已到的任务可被领取，
+# 领取时available_at推迟JOB_VISIBILITY_TIMEOUT秒，worker失联后任务自动重新可见
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (
+        db.Index('ix_job_status_available_at', 'status', 'available_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    priority = db.Column(db.Integer, nullable=False, default=0)  # 数值越大越先执行
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# 断点续传上传会话：分块写入UPLOAD_FOLDER/tmp/<id>.part，已接收的字节数以临时文件大小为准
+class UploadSession(db.Model):
+    __tablename__ = 'upload_session'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    filename = db.Column(db.String(255), nullable=False)  # 客户端提交的原始文件名
+    file_type = db.Column(db.String(50), nullable=False)
+    tags = db.Column(db.String(255), nullable=False, default='')
+    total_size = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Settings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -68,12 +435,528 @@ def get_file_type(filename):
         return 'video'
     return 'unknown'
 
+def parse_tags(tags):
+    """把逗号分隔的标签字符串拆成去重后的标签列表"""
+    result = []
+    for tag in (tags or '').split(','):
+        tag = tag.strip()
+        if tag and tag not in result:
+            result.append(tag)
+    return result
+
+def sync_media_tags(media):
+    """按media.tags重建该媒体在media_tag表中的记录（需在flush之后调用）"""
+    MediaTag.query.filter_by(media_id=media.id).delete()
+    for tag in parse_tags(media.tags):
+        db.session.add(MediaTag(media_id=media.id, tag=tag, created_at=media.created_at,
+                                hot_score=media.hot_score or 0, click_count=media.click_count or 0,
+                                file_size=media.file_size))
+
+# 标签热度：点击次数 + 出现次数 * 5
+TAG_COUNT_WEIGHT = 5
+
+# SQLite单条语句的绑定参数有上限，批量语句按此大小分块
+SQL_BATCH_SIZE = 300
+
+def chunked(items, size=SQL_BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def upsert_tag_stats(deltas):
+    """在当前事务中按{tag: (count_delta, clicks_delta)}增量更新tag_stats，出现次数归零的标签会被移除"""
+    if not deltas:
+        return
+    for tags in chunked(deltas):
+        rows = [{
+            'tag': tag,
+            'count': deltas[tag][0],
+            'clicks': deltas[tag][1],
+            'weight': deltas[tag][1] + deltas[tag][0] * TAG_COUNT_WEIGHT
+        } for tag in tags]
+        stmt = sqlite_insert(TagStat.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['tag'],
+            set_={
+                'count': TagStat.__table__.c.count + stmt.excluded.count,
+                'clicks': TagStat.__table__.c.clicks + stmt.excluded.clicks,
+                'weight': TagStat.__table__.c.weight + stmt.excluded.weight
+            }
+        )
+        db.session.execute(stmt)
+    removed = [tag for tag, (count_delta, _) in deltas.items() if count_delta < 0]
+    for tags in chunked(removed):
+        TagStat.query.filter(TagStat.tag.in_(tags), TagStat.count <= 0).delete(synchronize_session=False)
+
+def update_tag_stats(tags, count_delta=0, clicks_delta=0):
+    """对一组标签施加相同的增量"""
+    upsert_tag_stats({tag: (count_delta, clicks_delta) for tag in tags})
+
+def rebuild_tag_stats():
+    """根据media_tag和Media.click_count整表重建tag_stats，用于修复统计漂移"""
+    tag_count = db_writer.run(_rebuild_tag_stats)
+    catalog_version.bump('tags')
+    return tag_count
+
+def _rebuild_tag_stats():
+    TagStat.query.delete()
+    stats = db.session.query(
+        MediaTag.tag,
+        db.func.count(),
+        db.func.coalesce(db.func.sum(Media.click_count), 0)
+    ).join(Media, Media.id == MediaTag.media_id).group_by(MediaTag.tag).all()
+    for tag, count, clicks in stats:
+        db.session.add(TagStat(tag=tag, count=count, clicks=clicks, weight=clicks + count * TAG_COUNT_WEIGHT))
+    return len(stats)
+
+def conditional_get(key, click_ordered=False):
+    """
+    为只读目录接口添加强ETag和Last-Modified，If-None-Match命中时直接返回304，不查询数据库；
+    其余请求先查响应缓存，未命中时执行视图并缓存响应体（流式响应除外）
+    
+    点击计数写库只递增clicks版本号；click_ordered为True（或对请求参数返回True的函数）时
+    排序依赖点击数，ETag同时包含clicks版本号，其余响应不因点击写库失效
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            args_key = tuple(sorted(request.args.items(multi=True)))
+            parts = (request.path, args_key)
+            last_modified = catalog_version.last_modified(key)
+            if click_ordered is True or (callable(click_ordered) and click_ordered(request.args)):
+                parts += (catalog_version.version('clicks'),)
+                last_modified = max(last_modified, catalog_version.last_modified('clicks'))
+            etag = catalog_version.etag(key, *parts)
+            
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                cache_key = (request.path, args_key)
+                cached = response_cache.get(cache_key, etag)
+                if cached is not None:
+                    body, mimetype = cached
+                    response = app.response_class(body, mimetype=mimetype)
+                    response.headers['X-Cache'] = 'HIT'
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if not response.is_streamed:
+                        response_cache.set(cache_key, etag, response.get_data(), response.mimetype)
+                    response.headers['X-Cache'] = 'MISS'
+            
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # 要求客户端每次重新验证，保证写操作后立即可见
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+# 任务优先级
+JOB_PRIORITY_HIGH = 10
+JOB_PRIORITY_LOW = -10
+
+def enqueue_job(kind, payload, priority=0):
+    """在当前事务中写入任务，与触发它的数据修改一起提交"""
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        priority=priority,
+        max_attempts=app.config['JOB_MAX_ATTEMPTS']
+    )
+    db.session.add(job)
+    return job
+
+thumbnail_executor = None
+
+def schedule_thumbnails(media_id, file_path, filename):
+    """把缩略图生成交给进程池，完成后标记has_thumbnails，不阻塞上传请求"""
+    global thumbnail_executor
+    if thumbnail_executor is None:
+        thumbnail_executor = ProcessPoolExecutor(max_workers=app.config['THUMBNAIL_WORKERS'])
+    
+    future = thumbnail_executor.submit(generate_thumbnails, file_path, app.config['UPLOAD_FOLDER'], filename)
+    future.add_done_callback(lambda f: mark_thumbnails_ready(media_id, f))
+
+def mark_thumbnails_ready(media_id, future):
+    try:
+        future.result()
+    except Exception as e:
+        print(f"生成缩略图失败: {media_id}: {e}")
+        return
+    
+    db_writer.run(lambda: Media.query.filter_by(id=media_id).update({Media.has_thumbnails: True}))
+    catalog_version.bump('media')
+
+def thumbnail_urls(filename, has_thumbnails):
+    """返回{尺寸: WebP缩略图URL}，同路径的.jpg为JPEG版本"""
+    if not has_thumbnails:
+        return {}
+    return {str(size): f"/uploads/{thumbnail_name(filename, size)}" for size in THUMBNAIL_SIZES}
+
+# 媒体列表字段：只查询请求的列，thumbnails由filename和has_thumbnails计算
+media_serializer = MediaSerializer(
+    columns={name: getattr(Media, name) for name in MEDIA_FIELDS + ('has_thumbnails', 'hot_score')},
+    computed={'thumbnails': (('filename', 'has_thumbnails'), thumbnail_urls)},
+    default_fields=MEDIA_FIELDS + ('thumbnails',)
+)
+
+def requested_fields():
+    """解析?fields=稀疏字段集，包含未知字段时返回None"""
+    try:
+        return media_serializer.parse_fields(request.args.get('fields', ''))
+    except ValueError:
+        return None
+
+def remove_thumbnails(filename):
+    for size in THUMBNAIL_SIZES:
+        for ext, _ in THUMBNAIL_FORMATS:
+            thumb_path = os.path.join(app.config['UPLOAD_FOLDER'], thumbnail_name(filename, size, ext))
+            if os.path.exists(thumb_path):
+                os.remove(thumb_path)
+
+def flush_click_counts(counts):
+    """把缓冲的点击增量用UPDATE ... CASE在一个事务内批量写入，并同步tag_stats"""
+    db_writer.run(apply_click_counts, counts)
+    # 只让按点击数排序的响应失效，见conditional_get
+    catalog_version.bump('clicks')
+
+def apply_click_counts(counts):
+    hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    for media_ids in chunked(counts):
+        increment = db.case({media_id: counts[media_id] for media_id in media_ids}, value=Media.id, else_=0)
+        Media.query.filter(Media.id.in_(media_ids)).update(
+            {Media.click_count: db.func.coalesce(Media.click_count, 0) + increment},
+            synchronize_session=False
+        )
+        increment = db.case({media_id: counts[media_id] for media_id in media_ids}, value=MediaTag.media_id, else_=0)
+        MediaTag.query.filter(MediaTag.media_id.in_(media_ids)).update(
+            {MediaTag.click_count: MediaTag.click_count + increment},
+            synchronize_session=False
+        )
+        
+        # 同时累加到当前小时的分时统计
+        stmt = sqlite_insert(ClickBucket.__table__).values(
+            [{'media_id': media_id, 'hour': hour, 'count': counts[media_id]} for media_id in media_ids]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['media_id', 'hour'],
+            set_={'count': ClickBucket.__table__.c.count + stmt.excluded.count}
+        )
+        db.session.execute(stmt)
+    
+    tag_clicks = {}
+    for media_ids in chunked(counts):
+        rows = db.session.query(MediaTag.media_id, MediaTag.tag).filter(MediaTag.media_id.in_(media_ids))
+        for media_id, tag in rows:
+            tag_clicks[tag] = tag_clicks.get(tag, 0) + counts[media_id]
+    upsert_tag_stats({tag: (0, clicks) for tag, clicks in tag_clicks.items()})
+
+click_buffer = ClickBuffer(
+    flush_click_counts,
+    interval=app.config['CLICK_FLUSH_INTERVAL'],
+    threshold=app.config['CLICK_FLUSH_THRESHOLD']
+)
+# 进程退出前写入剩余的点击计数
+atexit.register(click_buffer.flush)
+
+def refresh_hot_scores(now=None):
+    """
+    按click_bucket重新计算热度分：hot_score = Σ 每小时点击数 × 0.5^(距今小时数 / 半衰期)
+    只统计HOT_WINDOW_HOURS内的记录；窗口内每个小时的衰减系数在Python中算好，
+    由SQL按media_id GROUP BY求和（不依赖SQLite的数学函数），写线程只执行清理和批量UPDATE
+    """
+    now = now or datetime.utcnow()
+    half_life = app.config['HOT_HALF_LIFE_HOURS']
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    since = current_hour - timedelta(hours=app.config['HOT_WINDOW_HOURS'])
+    
+    decay = {}
+    for offset in range(app.config['HOT_WINDOW_HOURS'] + 1):
+        hour = current_hour - timedelta(hours=offset)
+        decay[hour] = 0.5 ** (max((now - hour).total_seconds(), 0) / 3600 / half_life)
+    score = db.func.sum(ClickBucket.count * db.case(decay, value=ClickBucket.hour, else_=0))
+    rows = db.session.query(ClickBucket.media_id, score) \
+        .filter(ClickBucket.hour >= since).group_by(ClickBucket.media_id)
+    scores = dict(rows)
+    
+    changed = db_writer.run(apply_hot_scores, scores, since)
+    if changed:
+        catalog_version.bump('media')
+    return len(scores)
+
+def apply_hot_scores(scores, since):
+    """
+    写线程中执行：清理窗口外的分时记录，窗口内没有点击的媒体归零，其余按CASE批量写入；
+    media_tag中的冗余列同样更新
+    """
+    ClickBucket.query.filter(ClickBucket.hour < since).delete(synchronize_session=False)
+    active = db.session.query(ClickBucket.media_id).filter(ClickBucket.hour >= since)
+    expired = db.session.query(Media.id).filter(Media.hot_score > 0, Media.id.notin_(active))
+    # 先按media上的hot_score索引找出要归零的媒体更新media_tag，再归零media
+    MediaTag.query.filter(MediaTag.media_id.in_(expired)) \
+        .update({MediaTag.hot_score: 0}, synchronize_session=False)
+    changed = Media.query.filter(Media.hot_score > 0, Media.id.notin_(active)) \
+        .update({Media.hot_score: 0}, synchronize_session=False)
+    for media_ids in chunked(scores):
+        values = {media_id: round(scores[media_id], 6) for media_id in media_ids}
+        changed += Media.query.filter(Media.id.in_(media_ids)).update(
+            {Media.hot_score: db.case(values, value=Media.id, else_=0)}, synchronize_session=False
+        )
+        MediaTag.query.filter(MediaTag.media_id.in_(media_ids)).update(
+            {MediaTag.hot_score: db.case(values, value=MediaTag.media_id, else_=0)}, synchronize_session=False
+        )
+    return changed
+
+def scheduled_hot_score_refresh():
+    with app.app_context():
+        refresh_hot_scores()
+
+hot_score_task = PeriodicTask(
+    scheduled_hot_score_refresh,
+    interval=app.config['HOT_SCORE_INTERVAL'],
+    name='hot-scores'
+)
+
+@app.before_request
+def start_periodic_tasks():
+    # 收到第一个请求时才启动定时线程，导入app的脚本不会启动
+    hot_score_task.start()
+    upload_cleanup_task.start()
+
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+def media_storage_path(file_type, new_filename):
+    subdir = 'images' if file_type == 'image' else 'videos'
+    return os.path.join(app.config['UPLOAD_FOLDER'], subdir, new_filename)
+
+def blob_filename(sha256, original_filename):
+    """内容寻址文件名：<sha256>.<原扩展名>"""
+    return f"{sha256}.{original_filename.rsplit('.', 1)[1].lower()}"
+
+def hash_stream(stream):
+    hasher = hashlib.sha256()
+    for data in iter(lambda: stream.read(UPLOAD_BLOCK_SIZE), b''):
+        hasher.update(data)
+    return hasher.hexdigest()
+
+class BlobFileMissing(Exception):
+    """写线程中发现内容块文件不存在（已被删除），而调用方没有提供可放置的文件"""
+
+def save_upload_tmp(file, size):
+    """把上传内容写到uploads/tmp/下的临时文件，返回路径；由调用方在写操作结束后删除"""
+    tmp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.upload")
+    file.stream.seek(0)
+    with tracer.span('upload.save', bytes=size):
+        file.save(tmp_path)
+    return tmp_path
+
+def store_upload(file):
+    """
+    先对上传内容计算SHA-256，相同内容的文件已存在时不写盘，返回(sha256, 大小, None)；
+    否则写到临时文件，返回(sha256, 大小, 临时文件路径)。文件最终放置在写线程中完成，见place_blob_file
+    """
+    started = time.perf_counter()
+    with tracer.span('upload.hash') as span:
+        sha256 = hash_stream(file.stream)
+        size = file.stream.tell()
+        if span:
+            span.set(bytes=size)
+    with tracer.span('upload.dedupe'):
+        blob = db.session.get(Blob, sha256)
+        exists = blob is not None and os.path.exists(blob.file_path)
+    tmp_path = None if exists else save_upload_tmp(file, size)
+    record_upload(size, started)
+    return sha256, size, tmp_path
+
+def place_blob_file(source_path, sha256, original_filename, file_type):
+    """
+    写线程中执行：相同内容的文件已存在时直接复用；否则把source_path硬链接（不支持时复制）到内容寻址位置，
+    内容块记录还在但文件已丢失时放回记录中的路径。查找、放置和随后的acquire_blob在同一个写操作中，
+    与删除最后一个引用的操作串行执行，不会为已被删除的文件登记引用
+    
+    source_path保留，由调用方在写操作结束后删除（批次回滚后逐个重新执行时仍可再次放置）；
+    需要写文件而source_path为None时抛出BlobFileMissing。返回(文件名, 文件路径, 是否新写入)
+    """
+    blob = db.session.get(Blob, sha256)
+    if blob is not None and os.path.exists(blob.file_path):
+        return blob.filename, blob.file_path, False
+    if source_path is None:
+        raise BlobFileMissing(sha256)
+    
+    if blob is not None:
+        new_filename, file_path = blob.filename, blob.file_path
+    else:
+        new_filename = blob_filename(sha256, original_filename)
+        file_path = media_storage_path(file_type, new_filename)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    # 先写临时文件再替换，其他进程不会读到半个文件
+    placing_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(source_path, placing_path)
+    except OSError:
+        shutil.copyfile(source_path, placing_path)
+    os.replace(placing_path, file_path)
+    return new_filename, file_path, True
+
+def insert_uploads(uploads):
+    """
+    写线程中执行：uploads为[(源文件, sha256, 原始文件名, 类型, 标签)]，逐个放置内容块文件并写入Media记录；
+    任一条失败时删除本次新放置的文件后抛出异常（整个写操作回滚）。返回insert_media结果的列表
+    """
+    new_files = []
+    try:
+        results = []
+        for source_path, sha256, original_filename, file_type, tags in uploads:
+            new_filename, file_path, is_new = place_blob_file(source_path, sha256, original_filename, file_type)
+            if is_new:
+                new_files.append(file_path)
+            results.append(insert_media(secure_filename(original_filename), new_filename, file_type, file_path,
+                                        tags, sha256))
+        return results
+    except Exception:
+        for file_path in new_files:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        raise
+
+def acquire_blob(sha256, filename, file_path):
+    """在当前事务中为内容块增加一次引用，不存在时创建"""
+    stmt = sqlite_insert(Blob.__table__).values(
+        sha256=sha256,
+        filename=filename,
+        file_path=file_path,
+        file_size=os.path.getsize(file_path),
+        ref_count=1,
+        created_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['sha256'],
+        set_={'ref_count': Blob.__table__.c.ref_count + 1}
+    )
+    db.session.execute(stmt)
+
+def release_media_file(media):
+    """
+    在当前事务中释放媒体对文件的引用，返回提交后交给remove_media_files的(文件名, 路径, sha256)（无需删除时为None）
+    只有内容块的最后一个引用被删除时才删除文件；旧数据（无sha256）直接删除
+    """
+    if not media.sha256:
+        return media.filename, media.file_path, None
+    
+    blob = db.session.get(Blob, media.sha256)
+    if blob is None:
+        return None
+    blob.ref_count -= 1
+    if blob.ref_count > 0:
+        return None
+    db.session.delete(blob)
+    return blob.filename, blob.file_path, blob.sha256
+
+def remove_media_files(released):
+    """
+    写线程中执行：在释放引用的事务提交之后，删除release_media_file返回的文件及其缩略图。
+    提交后相同内容又被新上传（内容块记录重新存在）时保留文件；上传在写线程中放置文件并登记引用，
+    与这里的检查串行执行，不会删掉刚放置的文件
+    """
+    for item in released:
+        if item is None:
+            continue
+        filename, file_path, sha256 = item
+        if sha256 and db.session.get(Blob, sha256) is not None:
+            continue
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            remove_thumbnails(filename)
+        except Exception as e:
+            print(f"删除文件失败: {e}")
+
+def add_media(original_filename, new_filename, file_type, file_path, tags, sha256=None):
+    """在当前事务中为已保存到磁盘的文件写入Media记录，登记内容块引用，同步标签表和标签统计，不提交"""
+    media = Media(
+        filename=new_filename,
+        original_filename=original_filename,
+        file_type=file_type,
+        file_path=file_path,
+        tags=tags,
+        file_size=os.path.getsize(file_path),
+        sha256=sha256
+    )
+    # 相同内容的缩略图已存在时直接复用
+    if file_type == 'image' and thumbnails_exist(app.config['UPLOAD_FOLDER'], new_filename):
+        media.has_thumbnails = True
+    
+    db.session.add(media)
+    db.session.flush()
+    if sha256:
+        acquire_blob(sha256, new_filename, file_path)
+    sync_media_tags(media)
+    update_tag_stats(parse_tags(media.tags), count_delta=1)
+    
+    if app.config['JOB_QUEUE_ENABLED'] and file_type == 'image' and not media.has_thumbnails:
+        enqueue_job('thumbnails', {'media_id': media.id}, priority=JOB_PRIORITY_HIGH)
+    return media
+
+def insert_media(original_filename, new_filename, file_type, file_path, tags, sha256=None):
+    """
+    写线程中执行的add_media：返回(upload_result字典, 待生成缩略图的(id, 路径, 文件名))，
+    未启用任务队列时才需要在提交后安排缩略图，否则第二项为None
+    """
+    media = add_media(original_filename, new_filename, file_type, file_path, tags, sha256)
+    pending = None
+    if not app.config['JOB_QUEUE_ENABLED'] and file_type == 'image' and not media.has_thumbnails:
+        pending = (media.id, media.file_path, media.filename)
+    return upload_result(media), pending
+
+def media_created(pending_thumbnails):
+    """新媒体提交后递增版本号，并安排insert_media返回的缩略图生成"""
+    catalog_version.bump('media', 'tags', 'stats')
+    for pending in pending_thumbnails:
+        if pending:
+            schedule_thumbnails(*pending)
+
+def create_upload_media(file, file_type, tags):
+    """普通上传：计算哈希并在需要时写出临时文件，再由写线程放置文件并写入Media记录，返回upload_result字典"""
+    sha256, size, tmp_path = store_upload(file)
+    try:
+        with tracer.span('db.write'):
+            try:
+                (result, pending), = db_writer.run(insert_uploads, [(tmp_path, sha256, file.filename, file_type, tags)])
+            except BlobFileMissing:
+                # 计算哈希之后相同内容的最后一个引用被删除，写出文件后重试
+                tmp_path = save_upload_tmp(file, size)
+                (result, pending), = db_writer.run(insert_uploads, [(tmp_path, sha256, file.filename, file_type, tags)])
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    media_created([pending])
+    return result
+
+def upload_result(media):
+    return {
+        'id': media.id,
+        'filename': media.filename,
+        'original_filename': media.original_filename,
+        'file_type': media.file_type,
+        'file_path': media.file_path,
+        'tags': media.tags,
+        'created_at': media.created_at.isoformat(),
+        'file_size': media.file_size
+    }
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
+    # 首次访问request.files时解析multipart请求体
+    with tracer.span('upload.parse'):
+        files = request.files
+    if 'file' not in files:
         return jsonify({'error': 'No file part'}), 400
     
-    file = request.files['file']
+    file = files['file']
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
     
@@ -82,131 +965,575 @@ def upload_file():
         if file_type == 'unknown':
             return jsonify({'error': 'File type not allowed'}), 400
         
-        filename = secure_filename(file.filename)
-        file_id = str(uuid.uuid4())
-        new_filename = f"{file_id}_{filename}"
-        
-        if file_type == 'image':
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], 'images', new_filename)
-        else:
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], 'videos', new_filename)
-        
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        file.save(file_path)
-        
-        tags = request.form.get('tags', '')
+        result = create_upload_media(file, file_type, request.form.get('tags', ''))
+        return jsonify(result), 201
+    
+    return jsonify({'error': 'File type not allowed'}), 400
+
+# 断点续传：每个会话的增量SHA-256状态 {upload_id: (已哈希字节数, hashlib对象)}，进程重启后从临时文件重建
+upload_hashers = {}
+upload_locks = {}
+upload_state_lock = threading.Lock()
+
+def upload_part_path(upload_id):
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'tmp', f"{upload_id}.part")
+
+def upload_lock(upload_id):
+    with upload_state_lock:
+        return upload_locks.setdefault(upload_id, threading.Lock())
+
+def upload_hasher(upload_id, part_path, offset):
+    """取得已覆盖前offset字节的哈希对象，内存中没有时重新读取临时文件计算"""
+    state = upload_hashers.get(upload_id)
+    if state and state[0] == offset:
+        return state[1]
+    
+    hasher = hashlib.sha256()
+    with open(part_path, 'rb') as f:
+        remaining = offset
+        while remaining > 0:
+            data = f.read(min(UPLOAD_BLOCK_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher
+
+def discard_upload(session):
+    part_path = upload_part_path(session.id)
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    with upload_state_lock:
+        upload_hashers.pop(session.id, None)
+        upload_locks.pop(session.id, None)
+
+def upload_received(session):
+    """已接收的字节数；临时文件已被清理（会话过期、进程中断）时和会话不存在一样返回404"""
+    try:
+        return os.path.getsize(upload_part_path(session.id))
+    except FileNotFoundError:
+        abort(404)
+
+def upload_status(session):
+    return {
+        'upload_id': session.id,
+        'filename': session.filename,
+        'offset': upload_received(session),
+        'size': session.total_size
+    }
+
+# 创建断点续传会话
+@app.route('/api/uploads', methods=['POST'])
+def create_upload_session():
+    data = request.get_json(silent=True) or {}
+    original_filename = data.get('filename') or ''
+    total_size = data.get('size')
+    
+    if not allowed_file(original_filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+    file_type = get_file_type(original_filename)
+    if file_type == 'unknown':
+        return jsonify({'error': 'File type not allowed'}), 400
+    if not isinstance(total_size, int) or total_size <= 0:
+        return jsonify({'error': 'Invalid size'}), 400
+    if total_size > app.config['RESUMABLE_MAX_SIZE']:
+        return jsonify({'error': 'File too large'}), 413
+    
+    def insert_session():
+        session = UploadSession(filename=original_filename, file_type=file_type, tags=data.get('tags', ''), total_size=total_size)
+        db.session.add(session)
+        db.session.flush()
+        return session.id
+    upload_id = db_writer.run(insert_session)
+    
+    part_path = upload_part_path(upload_id)
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    open(part_path, 'wb').close()
+    
+    return jsonify({'upload_id': upload_id, 'filename': original_filename, 'offset': 0, 'size': total_size}), 201
+
+# 查询已接收的字节数，客户端据此从断点继续
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    session = UploadSession.query.get_or_404(upload_id)
+    return jsonify(upload_status(session))
+
+# 上传分块：请求体为原始字节，offset必须等于当前已接收字节数
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    session = UploadSession.query.get_or_404(upload_id)
+    offset = request.args.get('offset', type=int)
+    length = request.content_length
+    part_path = upload_part_path(session.id)
+    
+    if length is None:
+        return jsonify({'error': 'Content-Length required'}), 411
+    
+    with upload_lock(session.id):
+        current = upload_received(session)
+        if offset != current:
+            return jsonify({'error': 'Offset mismatch', 'offset': current}), 409
+        if current + length > session.total_size:
+            return jsonify({'error': 'Chunk exceeds declared size', 'offset': current}), 400
         
-        media = Media(
-            filename=new_filename,
-            original_filename=filename,
-            file_type=file_type,
-            file_path=file_path,
-            tags=tags,
-            file_size=os.path.getsize(file_path)
-        )
+        # 边接收边写入临时文件并更新哈希，内存占用与文件大小无关
+        hasher = upload_hasher(session.id, part_path, current)
+        written = current
+        started = time.perf_counter()
+        try:
+            with tracer.span('upload.write') as span, open(part_path, 'ab') as f:
+                while True:
+                    data = request.stream.read(UPLOAD_BLOCK_SIZE)
+                    if not data:
+                        break
+                    f.write(data)
+                    hasher.update(data)
+                    written += len(data)
+                if span:
+                    span.set(bytes=written - current)
+        finally:
+            # 连接中断时也记录已写入部分，下次从该位置继续
+            with upload_state_lock:
+                upload_hashers[session.id] = (written, hasher)
+            record_upload(written - current, started)
+    
+    return jsonify({'upload_id': session.id, 'offset': written, 'size': session.total_size})
+
+# 完成上传：校验大小后移动到正式目录，沿用普通上传的Media入库逻辑
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    session = UploadSession.query.get_or_404(upload_id)
+    part_path = upload_part_path(session.id)
+    
+    with upload_lock(session.id):
+        received = upload_received(session)
+        if received != session.total_size:
+            return jsonify({'error': 'Upload incomplete', 'offset': received}), 409
         
-        db.session.add(media)
-        db.session.commit()
+        with tracer.span('upload.hash'):
+            sha256 = upload_hasher(session.id, part_path, received).hexdigest()
+        upload = (part_path, sha256, session.filename, session.file_type, session.tags)
         
-        return jsonify({
-            'id': media.id,
-            'filename': media.filename,
-            'original_filename': media.original_filename,
-            'file_type': media.file_type,
-            'file_path': media.file_path,
-            'tags': media.tags,
-            'created_at': media.created_at.isoformat(),
-            'file_size': media.file_size
-        }), 201
+        # 删除会话、放置文件和写入Media在写线程的同一个写操作中完成；
+        # 临时文件保留到提交之后，失败时会话仍可重新complete
+        def finish_upload():
+            UploadSession.query.filter_by(id=upload_id).delete()
+            return insert_uploads([upload])[0]
+        with tracer.span('db.write'):
+            result, pending = db_writer.run(finish_upload)
+        discard_upload(session)
+        media_created([pending])
     
-    return jsonify({'error': 'File type not allowed'}), 400
+    result['sha256'] = sha256
+    return jsonify(result), 201
+
+def expire_upload_sessions():
+    """
+    删除超过RESUMABLE_SESSION_TTL秒没有收到分块的断点续传会话及其临时文件，
+    以及uploads/tmp/下不属于任何会话的过期文件（如进程中断留下的批量上传临时文件）
+    """
+    ttl = app.config['RESUMABLE_SESSION_TTL']
+    cutoff = time.time() - ttl
+    created_cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    
+    sessions = UploadSession.query.all()
+    expired = []
+    for session in sessions:
+        try:
+            stale = os.path.getmtime(upload_part_path(session.id)) < cutoff
+        except FileNotFoundError:
+            stale = session.created_at < created_cutoff
+        if stale:
+            expired.append(session)
+    
+    # 先删除会话，之后到达的分块请求返回404，不会写入已删除的临时文件
+    if expired:
+        def delete_sessions(ids):
+            for chunk in chunked(ids):
+                UploadSession.query.filter(UploadSession.id.in_(chunk)).delete(synchronize_session=False)
+        db_writer.run(delete_sessions, [session.id for session in expired])
+        for session in expired:
+            with upload_lock(session.id):
+                discard_upload(session)
+    
+    live = {f"{session.id}.part" for session in sessions} - {f"{session.id}.part" for session in expired}
+    tmp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'tmp')
+    orphans = 0
+    if os.path.isdir(tmp_dir):
+        for name in os.listdir(tmp_dir):
+            path = os.path.join(tmp_dir, name)
+            try:
+                if name not in live and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    orphans += 1
+            except FileNotFoundError:
+                continue
+    return len(expired), orphans
+
+def scheduled_upload_cleanup():
+    with app.app_context():
+        expire_upload_sessions()
+
+upload_cleanup_task = PeriodicTask(
+    scheduled_upload_cleanup,
+    interval=app.config['UPLOAD_CLEANUP_INTERVAL'],
+    name='upload-cleanup'
+)
+
+# 放弃上传，删除临时文件
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    session = UploadSession.query.get_or_404(upload_id)
+    with upload_lock(session.id):
+        discard_upload(session)
+        db_writer.run(lambda: UploadSession.query.filter_by(id=upload_id).delete())
+    return jsonify({'message': '上传已取消'})
+
+# /api/media的排序方式：{sort: (排序列, 游标中排序值的解析函数)}，均按(排序列, id)倒序走索引
+MEDIA_SORTS = {
+    'newest': ('created_at', datetime.fromisoformat),
+    'hot': ('hot_score', float),
+    'popular': ('click_count', int),
+    'largest': ('file_size', int),
+}
+
+def parse_cursor(cursor, parse_value=datetime.fromisoformat):
+    """解析游标参数"<排序值>,<id>"，格式错误时返回None"""
+    try:
+        value, media_id = cursor.split(',', 1)
+        return parse_value(value), media_id
+    except ValueError:
+        return None
+
+def format_cursor(value, media_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return f"{value},{media_id}"
+
+def stream_media(query, fields, extra, per_page, stream_format, trailer):
+    """
+    用yield_per逐块读取行，每块编码后立即发送，内存占用与per_page无关；
+    query应多取一条以判断是否还有下一页，trailer(最后一行, 是否还有下一页)返回分页信息
+    """
+    state = {'count': 0, 'last': None, 'has_more': False}
+    
+    def chunks():
+        rows = []
+        for row in query.yield_per(STREAM_CHUNK_SIZE):
+            if state['count'] == per_page:
+                state['has_more'] = True
+                break
+            state['count'] += 1
+            state['last'] = row
+            rows.append(row)
+            if len(rows) == STREAM_CHUNK_SIZE:
+                yield media_serializer.to_dicts(rows, fields, extra)
+                rows = []
+        if rows:
+            yield media_serializer.to_dicts(rows, fields, extra)
+    
+    def tail():
+        return trailer(state['last'], state['has_more'])
+    
+    if stream_format == 'ndjson':
+        body, mimetype = stream_ndjson(chunks(), tail), 'application/x-ndjson'
+    else:
+        body, mimetype = stream_json(chunks(), 'media', tail), 'application/json'
+    return app.response_class(stream_with_context(body), mimetype=mimetype)
 
 @app.route('/api/media', methods=['GET'])
+@conditional_get('media', click_ordered=lambda args: args.get('sort') == 'popular')
 def get_media():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     tag_filter = request.args.get('tag', '')
     type_filter = request.args.get('type', '')
+    sort = request.args.get('sort') or 'newest'
+    if per_page < 1:
+        return jsonify({'error': 'Invalid per_page'}), 400
+    if sort not in MEDIA_SORTS:
+        return jsonify({'error': 'Invalid sort'}), 400
+    sort_field, parse_sort_value = MEDIA_SORTS[sort]
+    # 带after参数（首页可为空）时使用游标分页，否则保留旧的页码分页
+    cursor_mode = 'after' in request.args
+    after = request.args.get('after', '')
+    # stream=json|ndjson时边查询边输出，适合per_page很大的请求
+    stream_format = request.args.get('stream', '')
+    if stream_format not in ('', 'json', 'ndjson'):
+        return jsonify({'error': 'Invalid stream format'}), 400
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Unknown fields'}), 400
     
-    query = Media.query
+    # 只查询需要的列，游标分页另外需要排序列和id
+    extra = (sort_field, 'id') if cursor_mode else ()
+    query = Media.query.with_entities(*media_serializer.select_columns(fields, extra))
+    order_columns = (getattr(Media, sort_field), Media.id)
     if tag_filter:
-        query = query.filter(Media.tags.contains(tag_filter))
+        # 通过media_tag精确匹配标签，按(tag, 排序列, media_id)索引顺序取数据
+        query = query.join(MediaTag, MediaTag.media_id == Media.id).filter(MediaTag.tag == tag_filter)
+        order_columns = (getattr(MediaTag, sort_field), MediaTag.media_id)
     if type_filter:
         query = query.filter(Media.file_type == type_filter)
     
-    media_items = query.order_by(Media.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    base_query = query
+    query = query.order_by(*[column.desc() for column in order_columns])
     
-    result = []
-    for media in media_items.items:
-        result.append({
-            'id': media.id,
-            'filename': media.filename,
-            'original_filename': media.original_filename,
-            'file_type': media.file_type,
-            'file_path': media.file_path,
-            'tags': media.tags,
-            'created_at': media.created_at.isoformat(),
-            'file_size': media.file_size,
-            'click_count': media.click_count
+    if cursor_mode:
+        if after:
+            cursor = parse_cursor(after, parse_sort_value)
+            if cursor is None:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            query = query.filter(db.tuple_(*order_columns) < db.tuple_(*cursor))
+        
+        # 总数可选：只有显式请求时才执行COUNT(*)
+        total = None
+        if request.args.get('with_total', 0, type=int):
+            total = base_query.count()
+        
+        # 多取一条用于判断是否还有下一页，避免COUNT(*)
+        if stream_format:
+            return stream_media(query.limit(per_page + 1), fields, extra, per_page, stream_format,
+                                lambda last, has_more: {
+                                    # 没有输出任何行时last为None
+                                    'next_cursor': format_cursor(getattr(last, sort_field), last.id)
+                                    if has_more and last is not None else None,
+                                    'total': total
+                                })
+        with tracer.span('media.query'):
+            rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        next_cursor = None
+        if has_more:
+            next_cursor = format_cursor(getattr(rows[-1], sort_field), rows[-1].id)
+    elif stream_format:
+        page = max(page, 1)
+        total = base_query.count()
+        return stream_media(query.offset((page - 1) * per_page).limit(per_page), fields, extra, per_page,
+                            stream_format, lambda last, has_more: {
+                                'total': total,
+                                'pages': (total + per_page - 1) // per_page,
+                                'current_page': page
+                            })
+    else:
+        with tracer.span('media.query'):
+            media_items = query.paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+        rows = media_items.items
+    
+    with tracer.span('media.serialize', rows=len(rows)):
+        result = media_serializer.to_dicts(rows, fields, extra)
+        
+        if cursor_mode:
+            return json_response(app.response_class, {
+                'media': result,
+                'next_cursor': next_cursor,
+                'total': total
+            })
+        
+        return json_response(app.response_class, {
+            'media': result,
+            'total': media_items.total,
+            'pages': media_items.pages,
+            'current_page': media_items.page
         })
+
+@app.route('/api/search', methods=['GET'])
+@conditional_get('media', click_ordered=True)
+def search_media():
+    q = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    type_filter = request.args.get('type', '')
+    if not q:
+        return jsonify({'error': 'Missing search query'}), 400
+    if per_page < 1:
+        return jsonify({'error': 'Invalid per_page'}), 400
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Unknown fields'}), 400
     
-    return jsonify({
-        'media': result,
-        'total': media_items.total,
-        'pages': media_items.pages,
-        'current_page': media_items.page
+    match, short_terms = split_query(q)
+    query = Media.query.with_entities(*media_serializer.select_columns(fields))
+    if match:
+        query = query.join(media_fts, media_fts.c.rowid == db.literal_column('media.rowid')) \
+            .filter(db.literal_column('media_fts').op('MATCH')(match))
+    for term in short_terms:
+        # 不足3个字符的词无法使用trigram索引，直接按子串过滤media表
+        pattern = like_pattern(term)
+        query = query.filter(db.or_(
+            Media.original_filename.like(pattern, escape='\\'),
+            Media.tags.like(pattern, escape='\\')
+        ))
+    if type_filter:
+        query = query.filter(Media.file_type == type_filter)
+    
+    # bm25越小越相关；按点击数放大相关度，点击越多越靠前，加成有上限以免热门文件压过精确匹配
+    clicks = db.func.coalesce(Media.click_count, 0)
+    boost = 1.0 + app.config['SEARCH_CLICK_WEIGHT'] * clicks / (clicks + app.config['SEARCH_CLICK_HALF'])
+    if match:
+        relevance = db.func.bm25(db.literal_column('media_fts'), *BM25_WEIGHTS)
+        query = query.order_by(relevance * boost, Media.id)
+    else:
+        # 只有短词时按(click_count, id)索引倒序读取并逐行过滤，取满一页即停止，不做全表排序
+        query = query.order_by(Media.click_count.desc(), Media.id.desc())
+    
+    # 多取一条判断是否还有下一页，避免COUNT(*)
+    rows = query.offset((max(page, 1) - 1) * per_page).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    
+    return json_response(app.response_class, {
+        'media': media_serializer.to_dicts(rows[:per_page], fields),
+        'query': q,
+        'current_page': page,
+        'has_more': has_more
     })
 
+def parse_batch_ids():
+    """从?ids=a,b,c或JSON请求体{"ids": [...]}读取媒体ID，去重并保持请求顺序"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        if not isinstance(ids, list):
+            return None
+        ids = [str(media_id) for media_id in ids]
+    else:
+        ids = request.args.get('ids', '').split(',')
+    return list(dict.fromkeys(media_id.strip() for media_id in ids if media_id.strip()))
+
+# 批量获取媒体：一次IN查询，按请求顺序返回，不存在的ID放在missing中
+@app.route('/api/media/batch', methods=['GET', 'POST'])
+def get_media_batch():
+    ids = parse_batch_ids()
+    if not ids:
+        return jsonify({'error': 'No media ids provided'}), 400
+    if len(ids) > app.config['BATCH_MAX_IDS']:
+        return jsonify({'error': f"At most {app.config['BATCH_MAX_IDS']} ids per request"}), 400
+    
+    if request.method == 'POST':
+        record_views = bool((request.get_json(silent=True) or {}).get('record_views'))
+    else:
+        record_views = bool(request.args.get('record_views', 0, type=int))
+    
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Unknown fields'}), 400
+    
+    rows = db.session.query(*media_serializer.select_columns(fields, ('id',))).filter(Media.id.in_(ids)).all()
+    found = {row.id: item for row, item in zip(rows, media_serializer.to_dicts(rows, fields, ('id',)))}
+    result = []
+    missing = []
+    for media_id in ids:
+        item = found.get(media_id)
+        if item is None:
+            missing.append(media_id)
+            continue
+        if record_views:
+            click_buffer.record(media_id)
+        if 'click_count' in item:
+            item['click_count'] = (item['click_count'] or 0) + click_buffer.pending(media_id)
+        result.append(item)
+    
+    return json_response(app.response_class, {'media': result, 'missing': missing})
+
 @app.route('/api/media/<media_id>', methods=['GET'])
 def get_media_item(media_id):
-    media = Media.query.get_or_404(media_id)
-    # 增加点击计数
-    media.click_count += 1
-    db.session.commit()
-    return jsonify({
-        'id': media.id,
-        'filename': media.filename,
-        'original_filename': media.original_filename,
-        'file_type': media.file_type,
-        'file_path': media.file_path,
-        'tags': media.tags,
-        'created_at': media.created_at.isoformat(),
-        'file_size': media.file_size,
-        'click_count': media.click_count
-    })
+    fields = requested_fields()
+    if fields is None:
+        return jsonify({'error': 'Unknown fields'}), 400
+    row = db.session.query(*media_serializer.select_columns(fields)).filter(Media.id == media_id).first()
+    if row is None:
+        abort(404)
+    
+    # 点击计数先进入缓冲，由后台批量写库，读取路径不再产生写事务
+    click_buffer.record(media_id)
+    item = media_serializer.to_dicts([row], fields)[0]
+    if 'click_count' in item:
+        item['click_count'] = (item['click_count'] or 0) + click_buffer.pending(media_id)
+    return json_response(app.response_class, item)
 
 @app.route('/uploads/<path:filename>')
 def serve_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    with tracer.span('serve.resolve'):
+        full_path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+        # 断点续传的临时文件不对外提供；safe_join已规范化路径，按规范化后的路径判断，
+        # 以免images/../tmp/、./tmp/等写法绕过
+        tmp_dir = os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], 'tmp'))
+        found = (
+            full_path is not None
+            and os.path.commonpath([os.path.abspath(full_path), tmp_dir]) != tmp_dir
+            and os.path.isfile(full_path)
+        )
+    if not found:
+        abort(404)
+    filename = os.path.relpath(full_path, app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+    
+    # 配置了X-Accel-Redirect时只做校验，文件内容（含Range）交给nginx内部location发送
+    prefix = app.config['X_ACCEL_REDIRECT_PREFIX']
+    if prefix:
+        response = app.response_class(mimetype=guess_mimetype(full_path))
+        response.headers['X-Accel-Redirect'] = prefix + quote(filename)
+        return response
+    
+    # 只计打开文件和生成响应头的时间，文件内容在视图返回后才由服务器发送
+    with tracer.span('serve.open'):
+        return send_file_ranged(request, app.response_class, full_path, use_sendfile=app.config['USE_SENDFILE'])
 
 @app.route('/api/tags', methods=['GET'])
+@conditional_get('tags', click_ordered=True)
 def get_tags():
-    media_items = Media.query.all()
-    tag_stats = {}
-    for media in media_items:
-        if media.tags:
-            for tag in media.tags.split(','):
-                tag = tag.strip()
-                if tag:
-                    if tag not in tag_stats:
-                        tag_stats[tag] = {'count': 0, 'clicks': 0}
-                    tag_stats[tag]['count'] += 1
-                    tag_stats[tag]['clicks'] += media.click_count
-    
-    # 计算标签热度（基于点击次数和出现频率）
-    tags_with_weight = []
-    for tag, stats in tag_stats.items():
-        weight = stats['clicks'] + (stats['count'] * 5)  # 点击次数权重更高
-        tags_with_weight.append({
-            'tag': tag,
-            'weight': weight,
-            'count': stats['count'],
-            'clicks': stats['clicks']
-        })
+    tag_stats = TagStat.query.order_by(TagStat.weight.desc()).all()
+    return jsonify({'tags': [{
+        'tag': stat.tag,
+        'weight': stat.weight,
+        'count': stat.count,
+        'clicks': stat.clicks
+    } for stat in tag_stats]})
+
+def compute_stats(days):
+    """用GROUP BY聚合媒体总数、类型分布、总字节数、标签分布和最近days天的每日上传数"""
+    by_type = {}
+    total_media = 0
+    total_bytes = 0
+    for file_type, count, size in db.session.query(
+            Media.file_type, db.func.count(), db.func.sum(Media.file_size)).group_by(Media.file_type):
+        by_type[file_type] = {'count': count, 'bytes': size or 0}
+        total_media += count
+        total_bytes += size or 0
+    
+    # 相同内容只存一份，实际占用按blob统计
+    stored_bytes = db.session.query(db.func.sum(Blob.file_size)).scalar() or 0
     
-    return jsonify({'tags': sorted(tags_with_weight, key=lambda x: x['weight'], reverse=True)})
+    tag_count = db.func.count().label('count')
+    tag_rows = db.session.query(MediaTag.tag, tag_count).group_by(MediaTag.tag) \
+        .order_by(tag_count.desc(), MediaTag.tag).limit(app.config['STATS_TAG_LIMIT']).all()
+    total_tags = db.session.query(db.func.count(db.distinct(MediaTag.tag))).scalar()
+    
+    # 按created_at索引范围扫描最近days天
+    since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    day = db.func.date(Media.created_at)
+    daily_rows = db.session.query(day, db.func.count()) \
+        .filter(Media.created_at >= since).group_by(day).order_by(day).all()
+    
+    return {
+        'total_media': total_media,
+        'total_bytes': total_bytes,
+        'stored_bytes': stored_bytes,
+        'by_type': by_type,
+        'total_tags': total_tags,
+        'tags': [{'tag': tag, 'count': count} for tag, count in tag_rows],
+        'uploads_per_day': [{'date': date, 'count': count} for date, count in daily_rows]
+    }
+
+# 媒体库统计
+@app.route('/api/stats', methods=['GET'])
+@conditional_get('stats')
+def get_stats():
+    # 结果由conditional_get按stats版本号缓存，上传或删除后失效
+    days = min(max(request.args.get('days', 30, type=int), 1), app.config['STATS_MAX_DAYS'])
+    return jsonify(compute_stats(days))
 
 # 管理员登录API
 @app.route('/api/admin/login', methods=['POST'])
@@ -269,66 +1596,241 @@ def admin_upload_file():
         if file_type == 'unknown':
             return jsonify({'error': 'File type not allowed'}), 400
         
-        filename = secure_filename(file.filename)
-        file_id = str(uuid.uuid4())
-        new_filename = f"{file_id}_{filename}"
-        
-        if file_type == 'image':
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], 'images', new_filename)
-        else:
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], 'videos', new_filename)
-        
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        file.save(file_path)
-        
-        tags = request.form.get('tags', '')
-        
-        media = Media(
-            filename=new_filename,
-            original_filename=filename,
-            file_type=file_type,
-            file_path=file_path,
-            tags=tags,
-            file_size=os.path.getsize(file_path)
-        )
-        
-        db.session.add(media)
-        db.session.commit()
-        
-        return jsonify({
-            'id': media.id,
-            'filename': media.filename,
-            'original_filename': media.original_filename,
-            'file_type': media.file_type,
-            'file_path': media.file_path,
-            'tags': media.tags,
-            'created_at': media.created_at.isoformat(),
-            'file_size': media.file_size
-        }), 201
+        result = create_upload_media(file, file_type, request.form.get('tags', ''))
+        return jsonify(result), 201
     
     return jsonify({'error': 'File type not allowed'}), 400
 
+# 管理员批量上传：multipart请求中的每个文件边接收边写盘并计算哈希，所有记录在一个事务中写入
+@app.route('/api/admin/upload/bulk', methods=['POST'])
+@login_required
+def admin_bulk_upload():
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        return jsonify({'error': 'Expected multipart/form-data'}), 400
+    
+    tmp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    def open_part(filename):
+        return HashingFileWriter(os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part"), app.config['MAX_CONTENT_LENGTH'])
+    
+    # 绕过request.files，避免Werkzeug先把整个请求缓存到系统临时目录
+    stream = get_input_stream(request.environ, max_content_length=app.config['BULK_UPLOAD_MAX_SIZE'])
+    started = time.perf_counter()
+    try:
+        with tracer.span('upload.parse'):
+            fields, parts = read_multipart(stream, boundary.encode('latin-1'), open_part,
+                                           max_parts=app.config['BULK_UPLOAD_MAX_FILES'] + 10)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid multipart body: {e}'}), 400
+    record_upload(sum(writer.size for _, _, writer in parts), started)
+    
+    if len(parts) > app.config['BULK_UPLOAD_MAX_FILES']:
+        for _, _, writer in parts:
+            writer.discard()
+        return jsonify({'error': f"At most {app.config['BULK_UPLOAD_MAX_FILES']} files per request"}), 400
+    
+    tags = fields.get('tags', '')
+    results = []
+    pending = []
+    
+    try:
+        for _, original_filename, writer in parts:
+            result = {'name': original_filename}
+            results.append(result)
+            if not original_filename or not allowed_file(original_filename) \
+                    or get_file_type(original_filename) == 'unknown':
+                error = 'File type not allowed'
+            else:
+                error = writer.error
+            if error:
+                writer.discard()
+                result['error'] = error
+                continue
+            
+            pending.append((result, (writer.path, writer.sha256, original_filename,
+                                     get_file_type(original_filename), tags)))
+        # 所有文件的放置和入库在写线程的同一个写操作中完成，失败时其中新放置的文件已被删除
+        with tracer.span('db.write', media=len(pending)):
+            created = db_writer.run(insert_uploads, [upload for _, upload in pending]) if pending else []
+    except Exception as e:
+        return jsonify({'error': f'Bulk upload failed: {e}', 'results': results}), 500
+    finally:
+        for _, _, writer in parts:
+            if os.path.exists(writer.path):
+                writer.discard()
+    
+    media_created([thumbnail for _, thumbnail in created])
+    for (result, _), (media, _) in zip(pending, created):
+        result['media'] = media
+    
+    return jsonify({
+        'uploaded': len(created),
+        'failed': len(results) - len(created),
+        'results': results
+    }), 201 if created else 400
+
 # 管理员删除媒体文件
 @app.route('/api/admin/media/<media_id>', methods=['DELETE'])
 @login_required
 def admin_delete_media(media_id):
-    media = Media.query.get_or_404(media_id)
+    # 读取、释放引用和删除都在写线程中完成，并发删除共享内容块时引用计数不会错乱
+    def delete_media():
+        media = db.session.get(Media, media_id)
+        if media is None:
+            return False, None
+        
+        # 删除数据库记录（SQLite默认不启用外键，标签行需手动删除）
+        released = release_media_file(media)
+        MediaTag.query.filter_by(media_id=media.id).delete()
+        ClickBucket.query.filter_by(media_id=media.id).delete()
+        update_tag_stats(parse_tags(media.tags), count_delta=-1, clicks_delta=-(media.click_count or 0))
+        db.session.delete(media)
+        return True, released
     
-    # 删除文件
-    try:
-        if os.path.exists(media.file_path):
-            os.remove(media.file_path)
-    except Exception as e:
-        print(f"删除文件失败: {e}")
+    with tracer.span('db.write'):
+        found, released = db_writer.run(delete_media)
+    if not found:
+        abort(404)
+    catalog_version.bump('media', 'tags', 'stats')
     
-    # 删除数据库记录
-    db.session.delete(media)
-    db.session.commit()
+    # 提交成功后再删除文件，内容块仍被其他媒体引用时保留
+    with tracer.span('delete.files'):
+        db_writer.run(remove_media_files, [released])
     
     return jsonify({'message': '删除成功'})
 
+# 管理员批量删除：按ID分块查询和删除，内容块引用计数一次性调整，提交后统一删除文件
+@app.route('/api/admin/media/batch-delete', methods=['POST'])
+@login_required
+def admin_bulk_delete_media():
+    ids = parse_batch_ids()
+    if not ids:
+        return jsonify({'error': 'No media ids provided'}), 400
+    if len(ids) > app.config['BULK_DELETE_MAX_IDS']:
+        return jsonify({'error': f"At most {app.config['BULK_DELETE_MAX_IDS']} ids per request"}), 400
+    
+    # 读取和引用计数调整在写线程的同一个事务中完成
+    def delete_all():
+        rows = []
+        for chunk in chunked(ids):
+            rows.extend(db.session.query(
+                Media.id, Media.filename, Media.file_path, Media.tags, Media.click_count, Media.sha256
+            ).filter(Media.id.in_(chunk)))
+        found = {row.id for row in rows}
+        
+        released = []
+        blob_refs = {}
+        tag_deltas = {}
+        for row in rows:
+            if row.sha256:
+                blob_refs[row.sha256] = blob_refs.get(row.sha256, 0) + 1
+            else:
+                released.append((row.filename, row.file_path, None))
+            for tag in parse_tags(row.tags):
+                count_delta, clicks_delta = tag_deltas.get(tag, (0, 0))
+                tag_deltas[tag] = (count_delta - 1, clicks_delta - (row.click_count or 0))
+        
+        # 内容块的引用全部被删除时才删除文件
+        for chunk in chunked(list(blob_refs)):
+            for blob in Blob.query.filter(Blob.sha256.in_(chunk)):
+                blob.ref_count -= blob_refs[blob.sha256]
+                if blob.ref_count <= 0:
+                    released.append((blob.filename, blob.file_path, blob.sha256))
+                    db.session.delete(blob)
+        
+        deleted_ids = [media_id for media_id in ids if media_id in found]
+        for chunk in chunked(deleted_ids):
+            MediaTag.query.filter(MediaTag.media_id.in_(chunk)).delete(synchronize_session=False)
+            ClickBucket.query.filter(ClickBucket.media_id.in_(chunk)).delete(synchronize_session=False)
+            Media.query.filter(Media.id.in_(chunk)).delete(synchronize_session=False)
+        upsert_tag_stats(tag_deltas)
+        return found, deleted_ids, released
+    
+    with tracer.span('db.write', media=len(ids)):
+        found, deleted_ids, released = db_writer.run(delete_all)
+    catalog_version.bump('media', 'tags', 'stats')
+    
+    with tracer.span('delete.files', files=len(released)):
+        db_writer.run(remove_media_files, released)
+    
+    return jsonify({
+        'deleted': deleted_ids,
+        'missing': [media_id for media_id in ids if media_id not in found]
+    })
+
+# 响应缓存命中统计
+@app.route('/api/admin/cache', methods=['GET'])
+@login_required
+def admin_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/api/admin/cache', methods=['DELETE'])
+@login_required
+def admin_clear_cache():
+    response_cache.clear()
+    return jsonify({'message': '响应缓存已清空'})
+
+# 后台任务队列状态
+@app.route('/api/admin/jobs', methods=['GET'])
+@login_required
+def admin_job_stats():
+    rows = db.session.query(Job.kind, Job.status, db.func.count()).group_by(Job.kind, Job.status).all()
+    by_status = {}
+    by_kind = {}
+    for kind, status, count in rows:
+        by_status[status] = by_status.get(status, 0) + count
+        by_kind.setdefault(kind, {})[status] = count
+    
+    oldest = db.session.query(db.func.min(Job.created_at)).filter(Job.status == 'queued').scalar()
+    return jsonify({
+        'depth': by_status.get('queued', 0) + by_status.get('running', 0),
+        'by_status': by_status,
+        'by_kind': by_kind,
+        'oldest_queued_at': oldest.isoformat() if oldest else None
+    })
+
+# 重建标签统计（修复统计漂移）
+@app.route('/api/admin/tag-stats/rebuild', methods=['POST'])
+@login_required
+def admin_rebuild_tag_stats():
+    tag_count = rebuild_tag_stats()
+    return jsonify({'message': '标签统计重建成功', 'tags': tag_count})
+
+# 请求剖析记录列表（按时间倒序）
+@app.route('/api/admin/profiles', methods=['GET'])
+@login_required
+def admin_list_profiles():
+    return jsonify({'profiles': profile_store.list()})
+
+# 下载剖析结果：kind为pstats（python -m pstats或snakeviz打开）或collapsed（flamegraph.pl/speedscope）
+@app.route('/api/admin/profiles/<profile_id>/<kind>', methods=['GET'])
+@login_required
+def admin_download_profile(profile_id, kind):
+    path = profile_store.path(profile_id, kind)
+    if path is None:
+        abort(404)
+    mimetype = 'text/plain' if kind == 'collapsed' else 'application/octet-stream'
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=f"{profile_id}.{kind}")
+
+# 立即重新计算热度分
+@app.route('/api/admin/hot-scores/refresh', methods=['POST'])
+@login_required
+def admin_refresh_hot_scores():
+    media_count = refresh_hot_scores()
+    return jsonify({'message': '热度分已更新', 'media': media_count})
+
+def set_setting(key, value):
+    """写线程中执行：写入或更新一项设置"""
+    setting = Settings.query.filter_by(key=key).first()
+    if not setting:
+        setting = Settings(key=key)
+        db.session.add(setting)
+    setting.value = value
+
 # 获取背景图片设置
 @app.route('/api/settings/background', methods=['GET'])
+@conditional_get('settings')
 def get_background():
     setting = Settings.query.filter_by(key='background_image').first()
     if setting and setting.value:
@@ -371,15 +1873,11 @@ def upload_background():
         file.save(background_path)
         
         # 更新数据库设置
-        setting = Settings.query.filter_by(key='background_image').first()
-        if not setting:
-            setting = Settings(key='background_image')
-            db.session.add(setting)
-        
-        setting.value = f'/uploads/backgrounds/{background_filename}'
-        db.session.commit()
+        background_url = f'/uploads/backgrounds/{background_filename}'
+        db_writer.run(set_setting, 'background_image', background_url)
+        catalog_version.bump('settings')
         
-        return jsonify({'message': '背景图片上传成功', 'background_image': setting.value})
+        return jsonify({'message': '背景图片上传成功', 'background_image': background_url})
     
     return jsonify({'error': '文件类型不支持'}), 400
 
@@ -396,8 +1894,8 @@ def delete_background():
             os.remove(full_path)
         
         # 删除数据库记录
-        db.session.delete(setting)
-        db.session.commit()
+        db_writer.run(lambda: Settings.query.filter_by(key='background_image').delete())
+        catalog_version.bump('settings')
         
         return jsonify({'message': '背景图片删除成功'})
     
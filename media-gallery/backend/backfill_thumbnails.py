@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app import app, db, Media, catalog_version
+from scan_uploads import iter_upload_files, IMAGE_EXTENSIONS
+from thumbnails import generate_thumbnails, thumbnails_exist
+
+def backfill_thumbnails(workers=None):
+    """为上传目录中已有的图片补生成缩略图，并更新has_thumbnails标记"""
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+    pending = [
+        (filename, file_path)
+        for filename, file_path in iter_upload_files(upload_folder, 'images', IMAGE_EXTENSIONS)
+        if not thumbnails_exist(upload_folder, filename)
+    ]
+    print(f"需要生成缩略图的图片: {len(pending)} 张")
+
+    done = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(generate_thumbnails, file_path, upload_folder, filename): filename
+            for filename, file_path in pending
+        }
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                future.result()
+                done.append(filename)
+                print(f"生成缩略图: {filename}")
+            except Exception as e:
+                print(f"生成缩略图失败 {filename}: {e}")
+
+    # 已有缩略图文件但未标记的记录一并修正
+    with app.app_context():
+        marked = 0
+        for media in Media.query.filter(Media.file_type == 'image', Media.has_thumbnails.isnot(True)):
+            if thumbnails_exist(upload_folder, media.filename):
+                media.has_thumbnails = True
+                marked += 1
+        db.session.commit()
+        if marked:
+            # 列表中的缩略图URL随has_thumbnails改变，Web进程的缓存和客户端的ETag随之失效
+            catalog_version.bump('media')
+
+    print(f"完成！生成 {len(done)} 张，标记 {marked} 条媒体记录")
+
+if __name__ == '__main__':
+    backfill_thumbnails(int(sys.argv[1]) if len(sys.argv) > 1 else None)
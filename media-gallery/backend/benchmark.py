@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+端到端负载基准：生成1万/10万/100万条记录的合成媒体库，在进程内启动应用的HTTP服务，
+用多个保持连接的客户端线程压测各接口，输出每个场景的吞吐量和延迟分位数到JSON文件，
+不同提交的结果可用--compare对比
+
+用法:
+    python benchmark.py                                   # 1万和10万条，每个场景8个客户端、10秒
+    python benchmark.py --sizes 10000,100000,1000000 --clients 16 --duration 20
+    python benchmark.py --scenarios media_first_page,tags,upload --output before.json
+    python benchmark.py --compare before.json after.json
+
+每个规模在单独的子进程中运行（app.py在导入时绑定数据库），合成库按(规模, seed)缓存在
+--work-dir下，每次运行使用缓存的副本，上传等写操作不影响下一次运行。
+客户端和服务端在同一进程中运行，结果包含客户端开销，适合同一台机器上前后对比
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import http.client
+import io
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from urllib.parse import quote
+from datetime import datetime
+
+from generate_catalog import TAG_WORDS, create_schema, render_files, write_catalog
+from trace_summary import percentile
+
+DEFAULT_WORK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'benchmark')
+IMAGE_FIXTURES = 16
+# 生成的表结构或数据变化时递增，使instance/benchmark/下缓存的旧媒体库失效
+CATALOG_CACHE_VERSION = 2
+
+# ---------------------------------------------------------------- 压测场景
+
+class Workload:
+    """从数据库中抽取请求参数：媒体id、游标、按出现次数加权的标签和搜索词"""
+
+    def __init__(self, db_path, seed):
+        conn = sqlite3.connect(db_path)
+        total = conn.execute('SELECT COUNT(*) FROM media').fetchone()[0]
+        step = max(total // 2000, 1)
+        rows = conn.execute('SELECT id, created_at FROM media WHERE rowid % ? = 0 LIMIT 2000', (step,)).fetchall()
+        self.media_ids = [row[0] for row in rows]
+        self.cursors = [f"{datetime.fromisoformat(row[1]).isoformat()},{row[0]}" for row in rows]
+        tag_rows = conn.execute('SELECT tag, count FROM tag_stats ORDER BY count DESC').fetchall()
+        self.tags = [row[0] for row in tag_rows]
+        self.tag_weights = [row[1] for row in tag_rows]
+        self.total = total
+        self.search_terms = TAG_WORDS[:20] + [f"标签{i}" for i in range(1, 50, 7)] + [str(i) for i in range(100, 120)]
+        self.images = [f"images/{row[0]}" for row in conn.execute(
+            "SELECT filename FROM blob WHERE file_path LIKE '%.jpg' ORDER BY sha256")]
+        self.video, self.video_size = conn.execute(
+            "SELECT 'videos/' || filename, file_size FROM blob WHERE file_path LIKE '%.mp4' ORDER BY sha256").fetchone()
+        conn.close()
+        rng = random.Random(seed)
+        self.upload_bodies = [self._png(rng) for _ in range(64)]
+
+    @staticmethod
+    def _png(rng):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (64, 64), rng.randbytes(64 * 64 * 3)).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def tag(self, rng):
+        return rng.choices(self.tags, weights=self.tag_weights)[0]
+
+def multipart_body(rng, payload, tags):
+    boundary = f"bench{rng.getrandbits(64):016x}"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"tags\"\r\n\r\n{tags}\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench.png\"\r\n"
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode('utf-8') + payload + f"\r\n--{boundary}--\r\n".encode('ascii')
+    return body, {'Content-Type': f"multipart/form-data; boundary={boundary}"}
+
+def video_range(rng, w):
+    start = rng.randrange(w.video_size - 65536)
+    return {'Range': f"bytes={start}-{start + 65535}"}
+
+def _get(path, headers=None):
+    return 'GET', path, None, headers or {}
+
+# 场景名 -> 根据随机数生成器和Workload生成(method, path, body, headers)
+SCENARIOS = {
+    'media_first_page': lambda rng, w: _get('/api/media?after=&per_page=20'),
+    'media_deep_cursor': lambda rng, w: _get(f"/api/media?per_page=20&after={quote(rng.choice(w.cursors))}"),
+    'media_offset_page': lambda rng, w: _get(f"/api/media?per_page=20&page={rng.randint(1, max(w.total // 40, 1))}"),
+    'media_by_tag': lambda rng, w: _get(f"/api/media?after=&per_page=20&tag={quote(w.tag(rng))}"),
+    'media_hot': lambda rng, w: _get('/api/media?after=&per_page=20&sort=hot'),
+    'media_item': lambda rng, w: _get(f"/api/media/{rng.choice(w.media_ids)}"),
+    'tags': lambda rng, w: _get('/api/tags'),
+    'search': lambda rng, w: _get(f"/api/search?q={quote(rng.choice(w.search_terms))}"),
+    'stats': lambda rng, w: _get('/api/stats'),
+    'file_serve': lambda rng, w: _get(f"/uploads/{rng.choice(w.images)}"),
+    'file_range': lambda rng, w: _get(f"/uploads/{w.video}", video_range(rng, w)),
+    'upload': lambda rng, w: ('POST', '/api/upload', *multipart_body(rng, rng.choice(w.upload_bodies), w.tag(rng))),
+}
+
+def run_scenario(port, make_request, workload, clients, duration, warmup, seed):
+    """clients个线程各自保持一个连接循环发送请求，只统计预热结束后发出的请求"""
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+    latencies = [[] for _ in range(clients)]
+    statuses = [{} for _ in range(clients)]
+    errors = [0] * clients
+    nbytes = [0] * clients
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                break
+            method, path, body, headers = make_request(rng, workload)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                if sent >= measure_from:
+                    errors[index] += 1
+                continue
+            if sent >= measure_from:
+                latencies[index].append(time.perf_counter() - sent)
+                statuses[index][status] = statuses[index].get(status, 0) + 1
+                nbytes[index] += len(data)
+                if status >= 500:
+                    errors[index] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = max(time.perf_counter() - measure_from, 1e-9)
+
+    values = sorted(value * 1000 for per_client in latencies for value in per_client)
+    status_counts = {}
+    for per_client in statuses:
+        for status, count in per_client.items():
+            status_counts[str(status)] = status_counts.get(str(status), 0) + count
+    result = {
+        'requests': len(values),
+        'errors': sum(errors),
+        'throughput_rps': round(len(values) / elapsed, 2),
+        'bytes_per_second': round(sum(nbytes) / elapsed),
+        'status_counts': status_counts
+    }
+    if values:
+        result.update({
+            'mean_ms': round(sum(values) / len(values), 3),
+            'p50_ms': round(percentile(values, 50), 3),
+            'p90_ms': round(percentile(values, 90), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'p99_ms': round(percentile(values, 99), 3),
+            'max_ms': round(values[-1], 3)
+        })
+    return result
+
+# ---------------------------------------------------------------- 单个规模（子进程）
+
+def write_settings(run_dir, db_path, upload_folder, args):
+    settings_path = os.path.join(run_dir, 'settings.py')
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{db_path}",
+        'UPLOAD_FOLDER': upload_folder,
+        'CATALOG_VERSION_DIR': os.path.join(run_dir, 'catalog_version'),
+        'TRACE_FILE': os.path.join(run_dir, 'traces', 'spans.jsonl'),
+        'PROFILE_DIR': os.path.join(run_dir, 'profiles'),
+        'HOT_SCORE_INTERVAL': 0,
+        'TRACING_ENABLED': not args.no_tracing,
+        'TRACE_SAMPLE_RATE': 1.0,  # 测量每个请求都记录span时的开销
+    }
+    if args.no_response_cache:
+        settings['RESPONSE_CACHE_SIZE'] = 0
+    with open(settings_path, 'w', encoding='utf-8') as f:
+        for key, value in settings.items():
+            f.write(f"{key} = {value!r}\n")
+    return settings_path
+
+def run_size(args):
+    size = args.size
+    work_dir = os.path.abspath(args.work_dir)
+    run_dir = os.path.join(work_dir, f"run-{size}")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+    upload_folder = os.path.join(work_dir, 'uploads')
+    catalog_path = os.path.join(work_dir, f"catalog-v{CATALOG_CACHE_VERSION}-{size}-{args.seed}.db")
+    db_path = os.path.join(run_dir, 'bench.db')
+
+    os.environ['MEDIA_GALLERY_SETTINGS'] = write_settings(run_dir, db_path, upload_folder, args)
+    # 占位文件按内容寻址，已存在时不会重写；缓存的媒体库引用的就是这些文件
+    image_blobs, video_blobs = render_files(upload_folder, args.seed, IMAGE_FIXTURES, 1)
+
+    build_seconds = None
+    if os.path.exists(catalog_path):
+        shutil.copyfile(catalog_path, db_path)
+    else:
+        started = time.perf_counter()
+        create_schema(db_path)
+        write_catalog(db_path, size, args.seed, image_blobs, video_blobs)
+        build_seconds = round(time.perf_counter() - started, 2)
+        print(f"[{size}] 合成媒体库生成完成，用时 {build_seconds}s")
+        shutil.copyfile(db_path, catalog_path)
+
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from app import app
+
+    class QuietHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 允许客户端保持连接
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    workload = Workload(db_path, args.seed)
+    results = {}
+    for name in args.scenarios.split(','):
+        result = run_scenario(server.server_port, SCENARIOS[name], workload,
+                              args.clients, args.duration, args.warmup, args.seed)
+        results[name] = result
+        print(f"[{size}] {name:<20} {result['throughput_rps']:>9.1f} req/s  "
+              f"p50 {result.get('p50_ms', 0):>8.2f} ms  p99 {result.get('p99_ms', 0):>8.2f} ms  "
+              f"errors {result['errors']}")
+    server.shutdown()
+
+    with open(args.result_file, 'w', encoding='utf-8') as f:
+        json.dump({'catalog_size': size, 'build_seconds': build_seconds, 'scenarios': results}, f)
+
+# ---------------------------------------------------------------- 汇总和对比
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(base_path, new_path):
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    base_runs = {run['catalog_size']: run['scenarios'] for run in base['runs']}
+    print(f"{base['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    print(f"{'size':>8}  {'scenario':<20}{'req/s':>10}{'Δ':>9}{'p95 ms':>11}{'Δ':>9}{'p99 ms':>11}{'Δ':>9}")
+    for run in new['runs']:
+        for name, result in run['scenarios'].items():
+            old = base_runs.get(run['catalog_size'], {}).get(name)
+            line = f"{run['catalog_size']:>8}  {name:<20}{result['throughput_rps']:>10.1f}"
+            for key in ('throughput_rps', 'p95_ms', 'p99_ms'):
+                if key != 'throughput_rps':
+                    line += f"{result.get(key, 0):>11.2f}"
+                if old and old.get(key):
+                    line += f"{(result.get(key, 0) / old[key] - 1) * 100:>+8.1f}%"
+                else:
+                    line += f"{'-':>9}"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='媒体库端到端负载基准')
+    parser.add_argument('--sizes', default='10000,100000', help='合成媒体库规模，逗号分隔')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='要运行的场景，逗号分隔')
+    parser.add_argument('--clients', type=int, default=8, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=10, help='每个场景的统计时长（秒）')
+    parser.add_argument('--warmup', type=float, default=2, help='每个场景的预热时长（秒），不计入结果')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help='合成媒体库缓存和运行目录')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--no-response-cache', action='store_true', help='关闭进程内响应缓存')
+    parser.add_argument('--no-tracing', action='store_true', help='关闭span记录')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='对比两个结果文件')
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    unknown = [name for name in args.scenarios.split(',') if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}，可选: {', '.join(SCENARIOS)}")
+    if args.size:
+        run_size(args)
+        return
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    runs = []
+    for size in [int(value) for value in args.sizes.split(',')]:
+        result_file = os.path.join(args.work_dir, f"result-{size}.json")
+        command = [sys.executable, os.path.abspath(__file__), '--size', str(size), '--result-file', result_file]
+        for name in ('scenarios', 'clients', 'duration', 'warmup', 'seed', 'work_dir'):
+            command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+        command += ['--no-response-cache'] * args.no_response_cache + ['--no-tracing'] * args.no_tracing
+        subprocess.run(command, check=True)
+        with open(result_file, encoding='utf-8') as f:
+            runs.append(json.load(f))
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'clients': args.clients,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'response_cache': not args.no_response_cache,
+            'tracing': not args.no_tracing
+        },
+        'runs': runs
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(path):
+    """跨进程互斥锁：在锁文件上加排他锁，with块结束时释放"""
+    with open(path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class CatalogVersion:
+    """
+    按数据分类（media、tags、settings）维护的版本号，写操作提交后递增
+
+    指定state_dir时版本号保存在<state_dir>/<key>.version文件中，
+    多个Web进程和后台任务进程共享同一组版本号；递增时持有<key>.lock上的文件锁，
+    读取和写回之间不会被其他进程插入，写入用原子替换，读取不需要加锁。
+    不指定state_dir时只在当前进程内有效
+    """
+
+    def __init__(self, state_dir=None):
+        self.state_dir = state_dir
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._started = datetime.now(timezone.utc).replace(microsecond=0)
+        self._modified = {}
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+            self.epoch = self._load_epoch()
+        else:
+            # 每次进程启动使用新的epoch，避免重启后旧ETag误命中
+            self.epoch = uuid.uuid4().hex[:8]
+
+    def _load_epoch(self):
+        # 版本文件被清空时生成新的epoch，避免计数归零后旧ETag误命中
+        path = os.path.join(self.state_dir, 'epoch')
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            epoch = uuid.uuid4().hex[:8]
+            self._write(path, epoch)
+            return epoch
+
+    def _path(self, key):
+        return os.path.join(self.state_dir, f"{key}.version")
+
+    def _write(self, path, value):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(value))
+        os.replace(tmp_path, path)
+
+    def bump(self, *keys):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        with self._lock:
+            for key in keys:
+                if self.state_dir:
+                    with file_lock(os.path.join(self.state_dir, f"{key}.lock")):
+                        self._write(self._path(key), self.version(key) + 1)
+                else:
+                    self._versions[key] = self._versions.get(key, 0) + 1
+                    self._modified[key] = now
+
+    def version(self, key):
+        if self.state_dir:
+            try:
+                with open(self._path(key)) as f:
+                    return int(f.read() or 0)
+            except (FileNotFoundError, ValueError):
+                return 0
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def last_modified(self, key):
+        if self.state_dir:
+            try:
+                mtime = os.stat(self._path(key)).st_mtime
+                return datetime.fromtimestamp(int(mtime), timezone.utc)
+            except FileNotFoundError:
+                return self._started
+        with self._lock:
+            return self._modified.get(key, self._started)
+
+    def etag(self, key, *parts):
+        """由版本号和请求参数生成强ETag（不含引号）"""
+        digest = hashlib.sha1('\x00'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:16]
+        return f"{self.epoch}-{key}-{self.version(key)}-{digest}"
@@ -9,6 +9,7 @@ from flask_cors import CORS
 import sqlite3
 from datetime import datetime
 import uuid
+from media_serializer import MEDIA_FIELDS, MediaSerializer, json_response
 
 app = Flask(__name__)
 CORS(app)
@@ -33,28 +34,37 @@ class Media(db.Model):
     file_size = db.Column(db.Integer, nullable=False)
     click_count = db.Column(db.Integer, default=0)
 
+# 原生SQL查询使用的列名
+media_serializer = MediaSerializer({name: f"media.{name}" for name in MEDIA_FIELDS})
+
 @app.route('/api/media', methods=['GET'])
 def get_media():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     tag_filter = request.args.get('tag', '')
+    try:
+        fields = media_serializer.parse_fields(request.args.get('fields', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    columns = ', '.join(media_serializer.select_columns(fields))
     
     # Use direct SQL connection to avoid SQLAlchemy model caching issues
     conn = sqlite3.connect('media_gallery.db')
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
-    # Build query
+    # Build query (exact tag match through the indexed media_tag table)
     if tag_filter:
-        cursor.execute('''
-            SELECT * FROM media 
-            WHERE tags LIKE ? 
-            ORDER BY created_at DESC 
+        cursor.execute(f'''
+            SELECT {columns} FROM media_tag
+            JOIN media ON media.id = media_tag.media_id
+            WHERE media_tag.tag = ?
+            ORDER BY media_tag.created_at DESC
             LIMIT ? OFFSET ?
-        ''', (f'%{tag_filter}%', per_page, (page - 1) * per_page))
+        ''', (tag_filter, per_page, (page - 1) * per_page))
     else:
-        cursor.execute('''
-            SELECT * FROM media 
+        cursor.execute(f'''
+            SELECT {columns} FROM media 
             ORDER BY created_at DESC 
             LIMIT ? OFFSET ?
         ''', (per_page, (page - 1) * per_page))
@@ -63,30 +73,18 @@ def get_media():
     
     # Get total count
     if tag_filter:
-        cursor.execute('SELECT COUNT(*) FROM media WHERE tags LIKE ?', (f'%{tag_filter}%',))
+        cursor.execute('SELECT COUNT(*) FROM media_tag WHERE tag = ?', (tag_filter,))
     else:
         cursor.execute('SELECT COUNT(*) FROM media')
     
     total = cursor.fetchone()[0]
     
     # Convert to JSON
-    result = []
-    for media in media_items:
-        result.append({
-            'id': media['id'],
-            'filename': media['filename'],
-            'original_filename': media['original_filename'],
-            'file_type': media['file_type'],
-            'file_path': media['file_path'],
-            'tags': media['tags'],
-            'created_at': media['created_at'],
-            'file_size': media['file_size'],
-            'click_count': media['click_count']
-        })
+    result = media_serializer.to_dicts(media_items, fields)
     
     conn.close()
     
-    return jsonify({
+    return json_response(app.response_class, {
         'media': result,
         'total': total,
         'pages': (total + per_page - 1) // per_page,
@@ -100,7 +98,8 @@ def get_media_item(media_id):
     cursor = conn.cursor()
     
     # Get media item
-    cursor.execute('SELECT * FROM media WHERE id = ?', (media_id,))
+    columns = ', '.join(media_serializer.select_columns(MEDIA_FIELDS))
+    cursor.execute(f'SELECT {columns} FROM media WHERE id = ?', (media_id,))
     media = cursor.fetchone()
     
     if not media:
@@ -111,20 +110,11 @@ def get_media_item(media_id):
     cursor.execute('UPDATE media SET click_count = click_count + 1 WHERE id = ?', (media_id,))
     conn.commit()
     
-    result = {
-        'id': media['id'],
-        'filename': media['filename'],
-        'original_filename': media['original_filename'],
-        'file_type': media['file_type'],
-        'file_path': media['file_path'],
-        'tags': media['tags'],
-        'created_at': media['created_at'],
-        'file_size': media['file_size'],
-        'click_count': media['click_count'] + 1
-    }
+    result = media_serializer.to_dicts([media], MEDIA_FIELDS)[0]
+    result['click_count'] += 1
     
     conn.close()
-    return jsonify(result)
+    return json_response(app.response_class, result)
 
 @app.route('/api/tags', methods=['GET'])
 def get_tags():
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import threading
+
+class ClickBuffer:
+    """进程内点击计数缓冲：按media_id合并增量，定时或达到阈值时交给flush_func批量写库"""
+
+    def __init__(self, flush_func, interval=5.0, threshold=500):
+        self.flush_func = flush_func
+        self.interval = interval
+        self.threshold = threshold
+        self._pending = {}
+        self._total = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def record(self, media_id, count=1):
+        """记录点击，不触碰数据库"""
+        with self._lock:
+            self._pending[media_id] = self._pending.get(media_id, 0) + count
+            self._total += count
+            reached = self._total >= self.threshold
+            if self._thread is None:
+                # 首次记录时才启动后台线程，避免脚本导入app时多出线程
+                self._thread = threading.Thread(target=self._run, name='click-buffer', daemon=True)
+                self._thread.start()
+        if reached:
+            self._wakeup.set()
+
+    def pending(self, media_id):
+        """返回尚未写库的点击数"""
+        with self._lock:
+            return self._pending.get(media_id, 0)
+
+    def flush(self):
+        """把当前缓冲一次性写库，失败时把增量放回缓冲等待下次重试"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._total = 0
+        if not pending:
+            return 0
+
+        try:
+            self.flush_func(pending)
+        except Exception as e:
+            print(f"写入点击计数失败: {e}")
+            with self._lock:
+                for media_id, count in pending.items():
+                    self._pending[media_id] = self._pending.get(media_id, 0) + count
+                    self._total += count
+            return 0
+        return len(pending)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class DbWriter:
+    """
+    单写线程：所有写操作排队交给一个专用线程执行，同时到达的操作合并为一个事务提交（group commit），
+    避免多个请求线程争抢SQLite写锁（database is locked）和逐个fsync
+
+    写操作是在写线程的应用上下文中执行的函数，只修改db.session、不自行提交，返回值应为普通数据
+    （ORM对象属于写线程的session，不能交给请求线程使用）。批次中某个操作失败时整批回滚，
+    再逐个单独执行，只有失败的操作收到异常
+    """
+
+    def __init__(self, app, db, max_batch=64, max_wait=0.002):
+        self.app = app
+        self.db = db
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.operations = 0
+
+    def submit(self, func, *args, **kwargs):
+        """把写操作加入队列，返回提交完成后得到结果的Future"""
+        future = Future()
+        self._queue.put((func, args, kwargs, future))
+        with self._lock:
+            if self._thread is None:
+                # 首次写入时才启动写线程，避免脚本导入app时多出线程
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+        return future
+
+    def run(self, func, *args, **kwargs):
+        """执行写操作并等待提交；在写线程内调用时直接在当前事务中执行"""
+        if threading.current_thread() is self._thread:
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+
+    def _run(self):
+        while True:
+            ops = [self._queue.get()]
+            # 稍等片刻收集同时到达的写操作，合并到同一个事务
+            deadline = time.monotonic() + self.max_wait
+            while len(ops) < self.max_batch:
+                try:
+                    ops.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._execute(ops)
+
+    def _execute(self, ops):
+        with self.app.app_context():
+            results = []
+            try:
+                for func, args, kwargs, _ in ops:
+                    results.append(func(*args, **kwargs))
+                self.db.session.commit()
+            except Exception as e:
+                self.db.session.rollback()
+                if len(ops) == 1:
+                    ops[0][3].set_exception(e)
+                    return
+                failed = True
+            else:
+                failed = False
+
+        if failed:
+            for op in ops:
+                self._execute([op])
+            return
+
+        self.batches += 1
+        self.operations += len(ops)
+        for (_, _, _, future), result in zip(ops, results):
+            future.set_result(result)
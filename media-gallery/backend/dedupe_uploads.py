@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db, Media, Blob, blob_filename, catalog_version, hash_stream, acquire_blob, remove_thumbnails
+from thumbnails import THUMBNAIL_SIZES, THUMBNAIL_FORMATS, thumbnail_name
+
+def move_thumbnails(upload_folder, old_filename, new_filename):
+    """把旧文件名对应的缩略图改名为内容寻址文件名，目标已存在时删除旧的"""
+    for size in THUMBNAIL_SIZES:
+        for ext, _ in THUMBNAIL_FORMATS:
+            old_path = os.path.join(upload_folder, thumbnail_name(old_filename, size, ext))
+            new_path = os.path.join(upload_folder, thumbnail_name(new_filename, size, ext))
+            if not os.path.exists(old_path):
+                continue
+            if os.path.exists(new_path):
+                os.remove(old_path)
+            else:
+                os.replace(old_path, new_path)
+
+def dedupe_uploads():
+    """为旧媒体记录计算sha256，改用内容寻址文件并合并重复文件"""
+
+    with app.app_context():
+        db.create_all()
+        upload_folder = app.config['UPLOAD_FOLDER']
+        legacy = Media.query.filter(Media.sha256.is_(None)).all()
+        print(f"待处理的旧媒体记录: {len(legacy)} 条")
+
+        merged = 0
+        saved_bytes = 0
+        for media in legacy:
+            old_filename, old_path = media.filename, media.file_path
+            if not os.path.exists(old_path):
+                print(f"文件不存在，跳过: {old_path}")
+                continue
+
+            with open(old_path, 'rb') as f:
+                sha256 = hash_stream(f)
+
+            # 其他旧记录仍指向同一文件时不能移动或删除
+            still_used = Media.query.filter(Media.file_path == old_path, Media.id != media.id).count() > 0
+
+            blob = db.session.get(Blob, sha256)
+            duplicate = blob is not None and os.path.exists(blob.file_path)
+            if duplicate:
+                new_filename, new_path = blob.filename, blob.file_path
+            else:
+                new_filename = blob_filename(sha256, old_filename)
+                new_path = os.path.join(os.path.dirname(old_path), new_filename)
+                if still_used:
+                    shutil.copyfile(old_path, new_path)
+                else:
+                    os.replace(old_path, new_path)
+                    move_thumbnails(upload_folder, old_filename, new_filename)
+                print(f"改为内容寻址: {old_filename} -> {new_filename}")
+
+            media.filename = new_filename
+            media.file_path = new_path
+            media.sha256 = sha256
+            acquire_blob(sha256, new_filename, new_path)
+            db.session.commit()
+            # 文件名和路径已改变，Web进程缓存的列表和客户端的ETag随之失效，否则仍返回旧的文件URL；
+            # 统计中的实际存储字节数来自blob表
+            catalog_version.bump('media', 'stats')
+
+            if duplicate and not still_used and old_path != new_path:
+                saved_bytes += os.path.getsize(old_path)
+                os.remove(old_path)
+                remove_thumbnails(old_filename)
+                merged += 1
+                print(f"合并重复文件: {old_filename} -> {new_filename}")
+
+        print(f"完成！合并 {merged} 个重复文件，节省 {saved_bytes} 字节")
+
+if __name__ == '__main__':
+    dedupe_uploads()
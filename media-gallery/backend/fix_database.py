@@ -1,11 +1,57 @@
 #!/usr/bin/env python3
 """
 修复数据库架构问题
-为Media表添加click_count字段，为Settings表添加updated_at字段
+为Media表添加click_count、has_thumbnails、sha256、hot_score字段和索引，为Settings表添加updated_at字段
+回填为空的created_at，并重建media表使created_at为NOT NULL（游标分页按(created_at, id)比较，NULL行会被跳过）
 """
 import sqlite3
 import os
 
+from search_index import create_search_index, REBUILD_SQL
+
+# 与app.py中Media模型一致的表结构
+MEDIA_TABLE_DDL = '''
+    CREATE TABLE {name} (
+        id VARCHAR(36) NOT NULL,
+        filename VARCHAR(255) NOT NULL,
+        original_filename VARCHAR(255) NOT NULL,
+        file_type VARCHAR(50) NOT NULL,
+        file_path VARCHAR(500) NOT NULL,
+        tags VARCHAR(255) NOT NULL,
+        created_at DATETIME DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now') || '000') NOT NULL,
+        file_size INTEGER NOT NULL,
+        click_count INTEGER,
+        has_thumbnails BOOLEAN,
+        sha256 VARCHAR(64),
+        hot_score FLOAT DEFAULT '0' NOT NULL,
+        PRIMARY KEY (id)
+    )
+'''
+MEDIA_COLUMNS = ('id', 'filename', 'original_filename', 'file_type', 'file_path', 'tags', 'created_at',
+                 'file_size', 'click_count', 'has_thumbnails', 'sha256', 'hot_score')
+# 与migrate_media_tags.py回填media_tag时使用的时间一致；格式与SQLAlchemy写入的一致（带6位小数秒）
+MISSING_CREATED_AT = '1970-01-01 00:00:00.000000'
+
+def rebuild_media_table(cursor):
+    """
+    SQLite不能修改已有列的约束，按新结构建表后复制数据再替换；
+    保留rowid，全文检索索引仍然有效，media表上的索引和触发器随旧表删除后重新创建
+    """
+    cursor.execute("DROP TABLE IF EXISTS media_rebuild")
+    cursor.execute(MEDIA_TABLE_DDL.format(name='media_rebuild'))
+    columns = ', '.join(MEDIA_COLUMNS)
+    cursor.execute(f'''
+        INSERT INTO media_rebuild (rowid, {columns})
+        SELECT rowid, id, filename, original_filename, file_type, file_path, COALESCE(tags, ''),
+               COALESCE(created_at, ?), COALESCE(file_size, 0), click_count, has_thumbnails, sha256,
+               COALESCE(hot_score, 0)
+        FROM media
+    ''', (MISSING_CREATED_AT,))
+    cursor.execute("DROP TABLE media")
+    cursor.execute("ALTER TABLE media_rebuild RENAME TO media")
+    create_search_index(cursor.execute)
+    cursor.execute(REBUILD_SQL)
+
 def fix_database():
     db_path = 'media_gallery.db'
     
@@ -29,6 +75,56 @@ def fix_database():
         else:
             print("OK: click_count字段已存在")
         
+        # 添加has_thumbnails字段（如果不存在）
+        if 'has_thumbnails' not in columns:
+            print("添加has_thumbnails字段到Media表...")
+            cursor.execute("ALTER TABLE media ADD COLUMN has_thumbnails BOOLEAN DEFAULT 0")
+            print("OK: has_thumbnails字段添加成功")
+        else:
+            print("OK: has_thumbnails字段已存在")
+        
+        # 添加sha256字段（如果不存在），用于内容寻址去重
+        if 'sha256' not in columns:
+            print("添加sha256字段到Media表...")
+            cursor.execute("ALTER TABLE media ADD COLUMN sha256 VARCHAR(64)")
+            print("OK: sha256字段添加成功")
+        else:
+            print("OK: sha256字段已存在")
+        
+        # 添加hot_score字段（如果不存在），由refresh_hot_scores定期计算
+        if 'hot_score' not in columns:
+            print("添加hot_score字段到Media表...")
+            cursor.execute("ALTER TABLE media ADD COLUMN hot_score FLOAT NOT NULL DEFAULT 0")
+            print("OK: hot_score字段添加成功")
+        else:
+            print("OK: hot_score字段已存在")
+        
+        # 回填为空的created_at，旧表的created_at允许为空时重建为NOT NULL
+        cursor.execute("UPDATE media SET created_at = ? WHERE created_at IS NULL", (MISSING_CREATED_AT,))
+        print(f"OK: 回填了 {cursor.rowcount} 条记录的created_at")
+        # 数据库默认值CURRENT_TIMESTAMP写入的时间没有小数秒，补齐后才能与游标参数正确比较
+        cursor.execute("UPDATE media SET created_at = created_at || '.000000' WHERE length(created_at) = 19")
+        print(f"OK: 补齐了 {cursor.rowcount} 条记录的created_at格式")
+        cursor.execute("PRAGMA table_info(media)")
+        created_at_nullable = any(column[1] == 'created_at' and not column[3] for column in cursor.fetchall())
+        if created_at_nullable:
+            print("重建media表，created_at改为NOT NULL...")
+            rebuild_media_table(cursor)
+            print("OK: media表重建完成")
+        else:
+            print("OK: created_at已为NOT NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_sha256 ON media (sha256)")
+        
+        # 创建游标分页使用的(created_at, id)复合索引
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_created_at_id ON media (created_at, id)")
+        print("OK: ix_media_created_at_id索引已就绪")
+        
+        # sort=hot|popular|largest使用的复合索引
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_hot_score_id ON media (hot_score, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_click_count_id ON media (click_count, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_file_size_id ON media (file_size, id)")
+        print("OK: 排序索引已就绪")
+        
         # 检查Settings表是否存在
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='settings'")
         settings_table_exists = cursor.fetchone()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+确定性地生成大规模合成媒体库，用于性能测试：同一个seed总是生成相同的记录和文件
+
+- 媒体记录、标签关联、标签统计用executemany分批写入，整个生成过程只有一个事务；
+  写入期间去掉全文检索触发器，结束后一次性重建索引
+- 标签热度服从Zipf分布（每条媒体1-5个标签），上传时间均匀分布在CATALOG_ANCHOR（或--now）之前两年，
+  文件大小服从对数正态分布，点击数为长尾分布
+- 占位图片用进程池并行渲染并按内容寻址保存，媒体记录循环引用这些文件（blob表引用计数与之一致）
+
+用法:
+    python generate_catalog.py --count 100000                          # 写入应用配置的数据库和上传目录
+    python generate_catalog.py --count 1000000 --db /tmp/big.db --upload-folder /tmp/uploads
+    python generate_catalog.py --count 10000 --images 10000 --processes 8 --thumbnails
+    python generate_catalog.py --count 100000 --now 2026-01-01T00:00:00        # 指定时间锚点
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import hashlib
+import io
+import random
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+
+INSERT_BATCH_SIZE = 50000
+VIDEO_FIXTURE_SIZE = 8 * 1024 * 1024
+
+# 常见标签，其余为"标签N"
+TAG_WORDS = [
+    '风景', '自然', '人物', '城市', '动物', '美食', '旅行', '建筑', '夜景', '海洋',
+    '山脉', '森林', '日落', '花卉', '街拍', '运动', '汽车', '宠物', '猫', '狗',
+    '雪景', '秋天', '春天', '夏天', '冬天', '黑白', '人像', '婚礼', '家庭', '儿童',
+    '音乐', '艺术', '科技', '天空', '湖泊', '沙漠', '星空', '航拍', '微距', '复古'
+]
+TAG_VOCABULARY_SIZE = 2000
+TAG_ZIPF_EXPONENT = 1.1
+TAGS_PER_ITEM = ([1, 2, 3, 4, 5], [15, 35, 30, 15, 5])
+CATALOG_DAYS = 730
+# 生成时间的锚点，不取当前时间，保证同一个seed在任何时候生成的数据库完全相同
+CATALOG_ANCHOR = datetime(2025, 1, 1)
+IMAGE_SIZES = ([640, 800, 1024, 1600], [480, 600, 768, 1200])
+
+def tag_vocabulary():
+    return TAG_WORDS + [f"标签{i}" for i in range(TAG_VOCABULARY_SIZE - len(TAG_WORDS))]
+
+def save_blob(upload_folder, subdir, data, ext):
+    """按内容寻址保存文件，返回(sha256, 文件名, 文件路径, 大小)；文件已存在时不重复写入"""
+    sha256 = hashlib.sha256(data).hexdigest()
+    filename = f"{sha256}.{ext}"
+    file_path = os.path.join(upload_folder, subdir, filename)
+    if not os.path.exists(file_path):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+    return sha256, filename, file_path, len(data)
+
+def render_placeholder(index, seed, upload_folder, thumbnails):
+    """渲染第index张占位图（内容只由seed和index决定），在进程池中执行"""
+    from PIL import Image, ImageDraw
+    from thumbnails import generate_thumbnails, thumbnails_exist
+
+    rng = random.Random(f"{seed}-{index}")
+    size = (rng.choice(IMAGE_SIZES[0]), rng.choice(IMAGE_SIZES[1]))
+    color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+    img = Image.new('RGB', size, color)
+    draw = ImageDraw.Draw(img)
+    for _ in range(8):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        r = rng.randrange(20, size[1] // 3)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(255 - c for c in color))
+    draw.text((10, 10), f"#{index}", fill=(255, 255, 255))
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=85)
+
+    blob = save_blob(upload_folder, 'images', buffer.getvalue(), 'jpg')
+    if thumbnails and not thumbnails_exist(upload_folder, blob[1]):
+        generate_thumbnails(blob[2], upload_folder, blob[1])
+    return blob
+
+def render_files(upload_folder, seed, images, videos, processes=None, thumbnails=False):
+    """并行渲染占位图片，视频为确定性的随机字节；结果按index排序，保证记录引用的文件可复现"""
+    render = partial(render_placeholder, seed=seed, upload_folder=upload_folder, thumbnails=thumbnails)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        image_blobs = list(executor.map(render, range(images), chunksize=max(images // 64, 1)))
+    video_blobs = [
+        save_blob(upload_folder, 'videos', random.Random(f"{seed}-video-{i}").randbytes(VIDEO_FIXTURE_SIZE), 'mp4')
+        for i in range(videos)
+    ]
+    return image_blobs, video_blobs
+
+def generate_rows(count, seed, image_blobs, video_blobs, now, thumbnails=False):
+    """按seed确定性地生成(media行, media_tag行)，created_at按时间倒序均匀分布在最近CATALOG_DAYS天"""
+    rng = random.Random(seed)
+    vocabulary = tag_vocabulary()
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, len(vocabulary) + 1):
+        total += 1 / rank ** TAG_ZIPF_EXPONENT
+        cum_weights.append(total)
+    span_seconds = CATALOG_DAYS * 86400
+
+    for i in range(count):
+        media_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        created_at = (now - timedelta(seconds=span_seconds * i / count + rng.random())).strftime('%Y-%m-%d %H:%M:%S.%f')
+        tags = list(dict.fromkeys(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.choices(*TAGS_PER_ITEM)[0])))
+        if rng.random() < 0.85 or not video_blobs:
+            file_type, (sha256, filename, file_path, _) = 'image', image_blobs[i % len(image_blobs)]
+            file_size = int(rng.lognormvariate(14, 0.8))
+            original = f"{tags[0]}_{i}.jpg"
+        else:
+            file_type, (sha256, filename, file_path, _) = 'video', video_blobs[i % len(video_blobs)]
+            file_size = int(rng.lognormvariate(17.5, 1.0))
+            original = f"{tags[0]}_{i}.mp4"
+        click_count = int(rng.paretovariate(1.2)) - 1
+        hot_score = round(rng.expovariate(0.2), 6) if rng.random() < 0.05 else 0.0
+        has_thumbnails = 1 if file_type == 'image' and thumbnails else 0
+        yield (
+            (media_id, filename, original, file_type, file_path, ','.join(tags), created_at,
+             file_size, click_count, has_thumbnails, sha256, hot_score),
+            [(media_id, tag, created_at, hot_score, click_count, file_size) for tag in tags]
+        )
+
+def insert_batch(conn, media_rows, tag_rows):
+    conn.executemany('''
+        INSERT INTO media (id, filename, original_filename, file_type, file_path, tags, created_at,
+                           file_size, click_count, has_thumbnails, sha256, hot_score)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', media_rows)
+    conn.executemany('''
+        INSERT INTO media_tag (media_id, tag, created_at, hot_score, click_count, file_size)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', tag_rows)
+
+def write_catalog(db_path, count, seed, image_blobs, video_blobs, thumbnails=False, now=CATALOG_ANCHOR):
+    """在单个事务中写入count条媒体记录及其标签、标签统计和blob引用计数"""
+    from search_index import REBUILD_SQL, create_search_index
+    from app import TAG_COUNT_WEIGHT
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    try:
+        conn.execute('BEGIN')
+        for trigger in ('media_fts_insert', 'media_fts_delete', 'media_fts_update'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        media_batch, tag_batch = [], []
+        for media_row, tag_rows in generate_rows(count, seed, image_blobs, video_blobs, now, thumbnails):
+            media_batch.append(media_row)
+            tag_batch.extend(tag_rows)
+            if len(media_batch) >= INSERT_BATCH_SIZE:
+                insert_batch(conn, media_batch, tag_batch)
+                media_batch, tag_batch = [], []
+        insert_batch(conn, media_batch, tag_batch)
+
+        # 标签统计和blob引用计数从已写入的数据汇总，与增量维护的结果一致
+        conn.execute('DELETE FROM tag_stats')
+        conn.execute('''
+            INSERT INTO tag_stats (tag, count, clicks, weight)
+            SELECT tag, COUNT(*), SUM(click_count), SUM(click_count) + COUNT(*) * ?
+            FROM media_tag
+            GROUP BY tag
+        ''', (TAG_COUNT_WEIGHT,))
+        conn.executemany('''
+            INSERT INTO blob (sha256, filename, file_path, file_size, ref_count, created_at)
+            VALUES (?, ?, ?, ?, 0, ?)
+            ON CONFLICT (sha256) DO NOTHING
+        ''', [blob + (now.strftime('%Y-%m-%d %H:%M:%S.%f'),) for blob in image_blobs + video_blobs])
+        conn.execute('''
+            UPDATE blob SET ref_count = (SELECT COUNT(*) FROM media WHERE media.sha256 = blob.sha256)
+            WHERE sha256 IN (SELECT DISTINCT sha256 FROM media WHERE sha256 IS NOT NULL)
+        ''')
+        conn.execute(REBUILD_SQL)
+        create_search_index(conn.execute)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.close()
+
+def create_schema(db_path):
+    """按ORM模型建表（media表的after_create事件会一并创建全文检索索引）"""
+    from sqlalchemy import create_engine
+    from app import db
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+def generate_catalog(db_path, upload_folder, count, seed=42, images=16, videos=1,
+                     processes=None, thumbnails=False, append=False, now=CATALOG_ANCHOR):
+    create_schema(db_path)
+    conn = sqlite3.connect(db_path)
+    existing = conn.execute('SELECT COUNT(*) FROM media').fetchone()[0]
+    conn.close()
+    if existing and not append:
+        raise SystemExit(f"数据库中已有 {existing} 条媒体记录，追加请使用--append并换一个--seed")
+
+    started = time.perf_counter()
+    image_blobs, video_blobs = render_files(upload_folder, seed, max(images, 1), videos, processes, thumbnails)
+    rendered = time.perf_counter()
+    print(f"渲染文件: {len(image_blobs)} 张图片、{len(video_blobs)} 个视频，用时 {rendered - started:.2f}s")
+
+    write_catalog(db_path, count, seed, image_blobs, video_blobs, thumbnails, now)
+    print(f"写入媒体记录: {count} 条，用时 {time.perf_counter() - rendered:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description='生成确定性的合成媒体库')
+    parser.add_argument('--count', type=int, required=True, help='媒体记录数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='目标SQLite文件，默认应用配置的数据库')
+    parser.add_argument('--upload-folder', help='占位文件目录，默认应用配置的UPLOAD_FOLDER')
+    parser.add_argument('--images', type=int, default=16, help='渲染的不同占位图数量，图片记录循环引用')
+    parser.add_argument('--videos', type=int, default=1, help='生成的视频文件数量，0为只生成图片')
+    parser.add_argument('--processes', type=int, help='渲染进程数，默认CPU核数')
+    parser.add_argument('--thumbnails', action='store_true', help='同时生成缩略图')
+    parser.add_argument('--append', action='store_true', help='数据库非空时继续追加')
+    parser.add_argument('--now', type=datetime.fromisoformat, default=CATALOG_ANCHOR,
+                        help=f"上传时间的锚点（UTC，ISO格式），默认{CATALOG_ANCHOR.isoformat()}")
+    args = parser.parse_args()
+
+    from app import app, db
+    db_path = args.db
+    if db_path is None:
+        with app.app_context():
+            db_path = db.engine.url.database
+    generate_catalog(
+        os.path.abspath(db_path),
+        args.upload_folder or app.config['UPLOAD_FOLDER'],
+        args.count,
+        seed=args.seed,
+        images=args.images,
+        videos=args.videos,
+        processes=args.processes,
+        thumbnails=args.thumbnails,
+        append=args.append,
+        now=args.now
+    )
+
+if __name__ == '__main__':
+    main()
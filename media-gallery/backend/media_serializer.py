@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import json
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库json
+    orjson = None
+
+STREAM_CHUNK_SIZE = 200  # 流式输出时每次从数据库读取和编码的行数
+
+# 媒体列表接口默认返回的字段，与数据库列同名
+MEDIA_FIELDS = (
+    'id', 'filename', 'original_filename', 'file_type', 'file_path',
+    'tags', 'created_at', 'file_size', 'click_count'
+)
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj):
+    """编码为UTF-8 JSON字节串，datetime输出为ISO 8601格式"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+def json_response(response_class, payload, status=200):
+    return response_class(dumps(payload), status=status, mimetype='application/json')
+
+class MediaSerializer:
+    """
+    媒体序列化：按请求的字段只查询需要的列，把结果行（元组）直接转换为字典，不构造ORM对象
+
+    columns为{字段名: 列}，列可以是SQLAlchemy列，也可以是原生SQL中的列名；
+    computed为{字段名: (依赖的字段名元组, 函数)}，函数按依赖顺序接收列值
+    """
+
+    def __init__(self, columns, computed=None, default_fields=None):
+        self.columns = columns
+        self.computed = computed or {}
+        self.default_fields = tuple(default_fields or MEDIA_FIELDS)
+        self.allowed = set(columns) | set(self.computed)
+
+    def parse_fields(self, value):
+        """解析?fields=a,b,c，为空时返回默认字段；包含未知字段时抛出ValueError"""
+        if not value:
+            return self.default_fields
+        fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in fields if name not in self.allowed]
+        if unknown or not fields:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
+    def column_names(self, fields, extra=()):
+        """返回需要查询的列名（包括计算字段的依赖和extra中的列），按出现顺序去重"""
+        names = []
+        for name in tuple(fields) + tuple(extra):
+            for column_name in self.computed[name][0] if name in self.computed else (name,):
+                if column_name not in names:
+                    names.append(column_name)
+        return names
+
+    def select_columns(self, fields, extra=()):
+        return [self.columns[name] for name in self.column_names(fields, extra)]
+
+    def to_dicts(self, rows, fields, extra=()):
+        """rows中每行的列顺序须与select_columns(fields, extra)一致"""
+        index = {name: i for i, name in enumerate(self.column_names(fields, extra))}
+        getters = []
+        for name in fields:
+            if name in self.computed:
+                deps, func = self.computed[name]
+                positions = [index[dep] for dep in deps]
+                getters.append((name, None, func, positions))
+            else:
+                getters.append((name, index[name], None, None))
+
+        result = []
+        for row in rows:
+            item = {}
+            for name, position, func, positions in getters:
+                if func is None:
+                    item[name] = row[position]
+                else:
+                    item[name] = func(*[row[i] for i in positions])
+            result.append(item)
+        return result
+
+def stream_json(chunks, key, trailer=None):
+    """
+    按块输出{"<key>": [...], ...}：chunks逐个产生字典列表，每块编码后立即发送；
+    trailer在数组结束后调用，返回的字典作为其余字段追加（如分页游标）
+    """
+    yield b'{' + dumps(key) + b':['
+    first = True
+    for chunk in chunks:
+        if not chunk:
+            continue
+        body = b','.join(dumps(item) for item in chunk)
+        yield body if first else b',' + body
+        first = False
+    tail = trailer() if trailer else None
+    yield b'],' + dumps(tail)[1:] if tail else b']}'
+
+def stream_ndjson(chunks, trailer=None):
+    """按块输出NDJSON，每行一个字典；trailer返回的字典作为最后一行{"meta": {...}}"""
+    for chunk in chunks:
+        if chunk:
+            yield b''.join(dumps(item) + b'\n' for item in chunk)
+    tail = trailer() if trailer else None
+    if tail:
+        yield dumps({'meta': tail}) + b'\n'
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+创建media_tag标签关联表及索引（包括冗余自Media的排序列hot_score、click_count、file_size）
+并根据Media表中逗号分隔的tags字段回填数据（可重复执行）
+"""
+import sqlite3
+import os
+
+BATCH_SIZE = 5000
+
+def split_tags(tags):
+    result = []
+    for tag in (tags or '').split(','):
+        tag = tag.strip()
+        if tag and tag not in result:
+            result.append(tag)
+    return result
+
+def migrate_media_tags():
+    db_path = 'media_gallery.db'
+
+    if not os.path.exists(db_path):
+        print("数据库文件不存在，将创建新的数据库")
+        return
+
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        # 创建media_tag表（如果不存在）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS media_tag (
+                media_id VARCHAR(36) NOT NULL REFERENCES media (id) ON DELETE CASCADE,
+                tag VARCHAR(100) NOT NULL,
+                created_at DATETIME NOT NULL,
+                hot_score FLOAT DEFAULT '0' NOT NULL,
+                click_count INTEGER DEFAULT '0' NOT NULL,
+                file_size INTEGER DEFAULT '0' NOT NULL,
+                PRIMARY KEY (media_id, tag)
+            )
+        ''')
+        # 旧版本创建的表没有排序列
+        cursor.execute("PRAGMA table_info(media_tag)")
+        columns = [column[1] for column in cursor.fetchall()]
+        for name, column_type in (('hot_score', 'FLOAT'), ('click_count', 'INTEGER'), ('file_size', 'INTEGER')):
+            if name not in columns:
+                cursor.execute(f"ALTER TABLE media_tag ADD COLUMN {name} {column_type} DEFAULT '0' NOT NULL")
+                print(f"OK: 添加{name}字段到media_tag表")
+        # 重建索引，确保包含游标分页需要的media_id列
+        cursor.execute("DROP INDEX IF EXISTS ix_media_tag_tag_created_at")
+        cursor.execute('''
+            CREATE INDEX ix_media_tag_tag_created_at
+            ON media_tag (tag, created_at, media_id)
+        ''')
+        # 按标签筛选时sort=hot|popular|largest使用的索引
+        for name in ('hot_score', 'click_count', 'file_size'):
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS ix_media_tag_tag_{name} ON media_tag (tag, {name}, media_id)")
+        print("OK: media_tag表及索引已就绪")
+
+        # 清空后整表回填，保证与Media.tags一致
+        cursor.execute("DELETE FROM media_tag")
+
+        cursor.execute("SELECT id, tags, created_at, hot_score, click_count, file_size FROM media")
+        total = 0
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+
+            tag_rows = []
+            for media_id, tags, created_at, hot_score, click_count, file_size in rows:
+                for tag in split_tags(tags):
+                    tag_rows.append((media_id, tag, created_at or '1970-01-01 00:00:00.000000',
+                                     hot_score or 0, click_count or 0, file_size or 0))
+
+            conn.executemany(
+                "INSERT INTO media_tag (media_id, tag, created_at, hot_score, click_count, file_size) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                tag_rows
+            )
+            total += len(tag_rows)
+
+        print(f"OK: 回填了 {total} 条标签记录")
+
+        conn.commit()
+        conn.close()
+
+        print("标签表迁移完成！")
+
+    except Exception as e:
+        print(f"迁移标签表时出错: {e}")
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_media_tags()
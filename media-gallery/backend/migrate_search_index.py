@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+创建media_fts全文检索索引及同步触发器，并根据media表重建索引内容（可重复执行）
+执行VACUUM后media的rowid可能变化，也需要重新运行
+"""
+import sqlite3
+import os
+
+from search_index import create_search_index, REBUILD_SQL
+
+def migrate_search_index():
+    db_path = 'media_gallery.db'
+
+    if not os.path.exists(db_path):
+        print("数据库文件不存在，将创建新的数据库")
+        return
+
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        create_search_index(cursor.execute)
+        print("OK: media_fts索引及触发器已就绪")
+
+        cursor.execute(REBUILD_SQL)
+        cursor.execute("SELECT COUNT(*) FROM media")
+        print(f"OK: 重建了 {cursor.fetchone()[0]} 条媒体记录的索引")
+
+        conn.commit()
+        conn.close()
+
+        print("全文检索索引迁移完成！")
+
+    except Exception as e:
+        print(f"迁移全文检索索引时出错: {e}")
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_search_index()
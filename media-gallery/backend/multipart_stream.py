@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+from werkzeug.datastructures import MultiDict
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+READ_SIZE = 64 * 1024
+MAX_FIELD_SIZE = 64 * 1024  # 普通表单字段（如tags）的最大字节数
+
+class HashingFileWriter:
+    """把上传内容边写入文件边计算SHA-256；超过max_size后停止写入并记录错误，继续消费剩余数据"""
+
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+        self.size = 0
+        self.error = None
+        self._hasher = hashlib.sha256()
+        self._file = open(path, 'wb')
+
+    def write(self, data):
+        if self.error:
+            return
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.error = 'File too large'
+            return
+        self._hasher.update(data)
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def sha256(self):
+        return self._hasher.hexdigest()
+
+def read_multipart(stream, boundary, open_file, max_parts=None):
+    """
+    逐块解析multipart/form-data请求体，文件部分直接写入open_file(filename)返回的写入器，
+    不经过Werkzeug的临时文件，整个请求只读一遍、写一遍
+
+    返回(fields, files)：fields为普通字段的MultiDict，files为按出现顺序的(字段名, 文件名, 写入器)列表
+    """
+    decoder = MultipartDecoder(boundary, max_parts=max_parts)
+    fields = MultiDict()
+    files = []
+    part = None
+    writer = None
+    buffer = []
+    complete = False
+
+    try:
+        while True:
+            data = stream.read(READ_SIZE)
+            decoder.receive_data(data or None)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, Field):
+                    part, writer, buffer = event, None, []
+                elif isinstance(event, File):
+                    part, writer = event, open_file(event.filename)
+                    files.append((event.name, event.filename, writer))
+                elif isinstance(event, Data):
+                    if writer is not None:
+                        writer.write(event.data)
+                        if not event.more_data:
+                            writer.close()
+                    else:
+                        buffer.append(event.data)
+                        if sum(len(chunk) for chunk in buffer) > MAX_FIELD_SIZE:
+                            raise ValueError(f"表单字段过大: {part.name}")
+                        if not event.more_data:
+                            fields.add(part.name, b''.join(buffer).decode('utf-8', 'replace'))
+                event = decoder.next_event()
+            if isinstance(event, Epilogue):
+                complete = True
+            if not data:
+                break
+        # 请求体在结束边界之前中断（客户端断开、截断的请求），已写入的文件不完整
+        if not complete:
+            raise ValueError("请求体不完整")
+    except Exception:
+        for _, _, file_writer in files:
+            file_writer.discard()
+        raise
+
+    return fields, files
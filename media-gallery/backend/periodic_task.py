@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+import threading
+
+class PeriodicTask:
+    """后台定时任务：守护线程每隔interval秒调用一次func，单次失败只记录日志，不影响下一次执行"""
+
+    def __init__(self, func, interval, name):
+        self.func = func
+        self.interval = interval
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """启动后台线程，可重复调用；interval不大于0时不启动"""
+        if self._thread is not None or not self.interval or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.interval):
+            try:
+                self.func()
+            except Exception as e:
+                print(f"定时任务{self.name}执行失败: {e}")
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db, rebuild_tag_stats
+
+def main():
+    """根据media_tag表重建tag_stats标签统计"""
+    
+    with app.app_context():
+        db.create_all()
+        try:
+            tag_count = rebuild_tag_stats()
+            print(f"标签统计重建完成，共 {tag_count} 个标签")
+        except Exception as e:
+            print(f"重建标签统计失败: {e}")
+            db.session.rollback()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+请求级性能剖析：用cProfile执行单个请求，把pstats和折叠栈（collapsed stacks，可直接交给
+flamegraph.pl或speedscope）保存到有上限的目录中，超出上限时删除最旧的记录
+
+每条记录三个文件：<id>.pstats、<id>.collapsed和<id>.json（端点、路径、耗时等元数据），
+id以毫秒时间戳开头，按文件名排序即按时间排序
+"""
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+
+PROFILE_KINDS = ('pstats', 'collapsed')
+MAX_STACK_DEPTH = 200
+MIN_BUDGET = 1e-6  # 分配到的时间不足1微秒的分支不再展开，避免调用图路径数爆炸
+_ID_PATTERN = re.compile(r'^[0-9]{13}-[A-Za-z0-9_.]+-[0-9a-f]{8}$')
+
+def _frame_name(func):
+    filename, line, name = func
+    if filename == '~':
+        return name  # 内置函数，如<method 'execute' of 'sqlite3.Cursor' objects>
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+def collapsed_stacks(stats):
+    """
+    由pstats的调用关系还原折叠栈，返回{"a;b;c": 微秒}
+
+    cProfile只记录调用边（调用者→被调用者），不记录完整调用栈，因此从没有调用者的根函数出发，
+    按每条边占被调用函数累计时间的比例向下分配时间，与flameprof等工具的做法相同；
+    递归调用在栈中出现第二次时截断
+    """
+    children = {}
+    roots = []
+    for func, (_, _, _, ct, callers) in stats.stats.items():
+        # 累计时间中没有被已知调用边覆盖的部分（调用者在开始剖析前就已进入，如恢复执行的生成器）作为根
+        outside = ct
+        for caller, (_, _, _, edge_ct) in callers.items():
+            if caller in stats.stats:
+                children.setdefault(caller, []).append((func, edge_ct))
+                outside -= edge_ct
+        if outside >= MIN_BUDGET:
+            roots.append((func, outside))
+
+    stacks = {}
+
+    def walk(func, budget, path, names):
+        _, _, tt, ct, _ = stats.stats[func]
+        if ct <= 0 or budget < MIN_BUDGET:
+            return
+        scale = min(budget / ct, 1.0)
+        names = names + [_frame_name(func)]
+        key = ';'.join(names)
+        self_time = tt * scale
+        if self_time > 0:
+            stacks[key] = stacks.get(key, 0) + self_time
+        if len(names) >= MAX_STACK_DEPTH:
+            return
+        for child, edge_ct in children.get(func, ()):
+            if child in path:
+                continue
+            walk(child, edge_ct * scale, path | {child}, names)
+
+    for root, budget in roots:
+        walk(root, budget, {root}, [])
+    return {key: int(round(value * 1e6)) for key, value in stacks.items() if value * 1e6 >= 1}
+
+class ProfileStore:
+    """磁盘上的剖析结果环形存储，最多保留max_entries条"""
+
+    def __init__(self, directory, max_entries=50):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def new_id(self, endpoint):
+        safe_endpoint = re.sub(r'[^A-Za-z0-9_.]', '_', endpoint or 'unmatched')
+        return f"{int(time.time() * 1000):013d}-{safe_endpoint}-{uuid.uuid4().hex[:8]}"
+
+    def save(self, profile_id, profiler, endpoint, meta):
+        """保存一次剖析结果（profiler须已停止），profile_id由new_id生成"""
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile_id)
+
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(f"{base}.pstats")
+        stacks = collapsed_stacks(stats)
+        with open(f"{base}.collapsed", 'w', encoding='utf-8') as f:
+            for key, value in sorted(stacks.items()):
+                f.write(f"{key} {value}\n")
+        # 元数据最后写入，列表只列出已写完整的记录
+        meta = dict(meta, id=profile_id, endpoint=endpoint, total_calls=stats.total_calls)
+        with open(f"{base}.json.tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(f"{base}.json.tmp", f"{base}.json")
+
+        self._trim()
+
+    def _ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def _trim(self):
+        ids = self._ids()
+        for profile_id in ids[:max(len(ids) - self.max_entries, 0)]:
+            for ext in PROFILE_KINDS + ('json',):
+                try:
+                    os.remove(os.path.join(self.directory, f"{profile_id}.{ext}"))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """按时间倒序返回所有记录的元数据"""
+        entries = []
+        for profile_id in reversed(self._ids()):
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json"), encoding='utf-8') as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # 并发清理时文件可能已被删除
+        return entries
+
+    def path(self, profile_id, kind):
+        """返回记录文件路径，id或类型不合法、文件不存在时返回None"""
+        if kind not in PROFILE_KINDS or not _ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{kind}")
+        return path if os.path.exists(path) else None
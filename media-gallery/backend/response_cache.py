@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import threading
+import time
+from collections import OrderedDict
+
+class ResponseCache:
+    """
+    进程内响应缓存：按(路径, 规范化的查询参数)保存响应体，LRU淘汰并带TTL
+
+    每个条目记录生成时的校验值（ETag，包含目录数据版本号），读取时校验值不一致即视为失效，
+    上传、删除、设置修改等写操作递增版本号后旧条目不会再被命中
+    """
+
+    def __init__(self, max_entries=512, ttl=30, max_body_size=1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_body_size = max_body_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, validator):
+        """返回(响应体, mimetype)，未命中、过期或校验值不一致时返回None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_validator, expires_at, value = entry
+                if entry_validator == validator and expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, validator, body, mimetype):
+        if self.max_entries <= 0 or len(body) > self.max_body_size:
+            return
+        with self._lock:
+            self._entries[key] = (validator, time.monotonic() + self.ttl, (body, mimetype))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+媒体全文检索索引：FTS5外部内容表media_fts，使用trigram分词器（需要SQLite 3.34+），
+中文标签和文件名可按任意连续子串匹配；索引内容不重复存储，由触发器与media表保持同步
+
+media表的主键是字符串，索引通过media的隐式rowid关联。VACUUM可能重排rowid，
+执行VACUUM后需运行migrate_search_index.py重建索引
+"""
+
+# 文件名和标签两列的bm25权重，文件名命中更相关
+BM25_WEIGHTS = (10.0, 5.0)
+
+# trigram分词器至少需要3个字符才能走索引，更短的词退化为LIKE扫描
+MIN_MATCH_LENGTH = 3
+
+SEARCH_INDEX_DDL = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5(
+        original_filename, tags,
+        content='media', tokenize='trigram'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS media_fts_insert AFTER INSERT ON media BEGIN
+        INSERT INTO media_fts (rowid, original_filename, tags)
+        VALUES (new.rowid, new.original_filename, new.tags);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS media_fts_delete AFTER DELETE ON media BEGIN
+        INSERT INTO media_fts (media_fts, rowid, original_filename, tags)
+        VALUES ('delete', old.rowid, old.original_filename, old.tags);
+    END
+    ''',
+    # 只在文件名或标签变化时更新索引，点击计数写库不触发
+    '''
+    CREATE TRIGGER IF NOT EXISTS media_fts_update AFTER UPDATE OF original_filename, tags ON media BEGIN
+        INSERT INTO media_fts (media_fts, rowid, original_filename, tags)
+        VALUES ('delete', old.rowid, old.original_filename, old.tags);
+        INSERT INTO media_fts (rowid, original_filename, tags)
+        VALUES (new.rowid, new.original_filename, new.tags);
+    END
+    ''',
+]
+
+REBUILD_SQL = "INSERT INTO media_fts (media_fts) VALUES ('rebuild')"
+
+def create_search_index(execute):
+    """执行建表和触发器DDL（可重复执行），execute为连接或游标的execute方法"""
+    for statement in SEARCH_INDEX_DDL:
+        execute(statement)
+
+def split_query(q):
+    """
+    把搜索词按空白拆分，返回(FTS5 MATCH表达式, 短词列表)
+
+    每个词作为带引号的字符串匹配，多个词之间为AND；
+    不足MIN_MATCH_LENGTH个字符的词无法用trigram索引，单独返回
+    """
+    phrases = []
+    short_terms = []
+    for term in q.split():
+        if len(term) >= MIN_MATCH_LENGTH:
+            phrases.append('"' + term.replace('"', '""') + '"')
+        else:
+            short_terms.append(term)
+    return ' '.join(phrases), short_terms
+
+def like_pattern(term):
+    """转义LIKE通配符，配合ESCAPE '\\'使用"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
@@ -9,6 +9,7 @@ from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import uuid
 from datetime import datetime
+from media_serializer import MEDIA_FIELDS, MediaSerializer, json_response
 
 app = Flask(__name__)
 CORS(app)
@@ -33,6 +34,18 @@ class Media(db.Model):
     file_size = db.Column(db.Integer, nullable=False)
     click_count = db.Column(db.Integer, default=0)
 
+class MediaTag(db.Model):
+    __tablename__ = 'media_tag'
+    __table_args__ = (
+        db.Index('ix_media_tag_tag_created_at', 'tag', 'created_at', 'media_id'),
+    )
+
+    media_id = db.Column(db.String(36), db.ForeignKey('media.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+media_serializer = MediaSerializer({name: getattr(Media, name) for name in MEDIA_FIELDS})
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -49,31 +62,23 @@ def get_media():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     tag_filter = request.args.get('tag', '')
+    try:
+        fields = media_serializer.parse_fields(request.args.get('fields', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    query = Media.query
+    query = Media.query.with_entities(*media_serializer.select_columns(fields))
+    order_column = Media.created_at
     if tag_filter:
-        query = query.filter(Media.tags.contains(tag_filter))
+        query = query.join(MediaTag, MediaTag.media_id == Media.id).filter(MediaTag.tag == tag_filter)
+        order_column = MediaTag.created_at
     
-    media_items = query.order_by(Media.created_at.desc()).paginate(
+    media_items = query.order_by(order_column.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    result = []
-    for media in media_items.items:
-        result.append({
-            'id': media.id,
-            'filename': media.filename,
-            'original_filename': media.original_filename,
-            'file_type': media.file_type,
-            'file_path': media.file_path,
-            'tags': media.tags,
-            'created_at': media.created_at.isoformat(),
-            'file_size': media.file_size,
-            'click_count': media.click_count
-        })
-    
-    return jsonify({
-        'media': result,
+    return json_response(app.response_class, {
+        'media': media_serializer.to_dicts(media_items.items, fields),
         'total': media_items.total,
         'pages': media_items.pages,
         'current_page': media_items.page
@@ -85,17 +90,8 @@ def get_media_item(media_id):
     # 增加点击计数
     media.click_count += 1
     db.session.commit()
-    return jsonify({
-        'id': media.id,
-        'filename': media.filename,
-        'original_filename': media.original_filename,
-        'file_type': media.file_type,
-        'file_path': media.file_path,
-        'tags': media.tags,
-        'created_at': media.created_at.isoformat(),
-        'file_size': media.file_size,
-        'click_count': media.click_count
-    })
+    row = tuple(getattr(media, name) for name in MEDIA_FIELDS)
+    return json_response(app.response_class, media_serializer.to_dicts([row], MEDIA_FIELDS)[0])
 
 @app.route('/uploads/<path:filename>')
 def serve_file(filename):
@@ -159,6 +155,7 @@ def create_sample_data():
             file_id = str(uuid.uuid4())
             new_filename = f'{file_id}_{data["filename"]}'
             file_path = f'uploads/images/{new_filename}'
+            created_at = datetime.utcnow()
             
             media = Media(
                 id=file_id,
@@ -167,10 +164,13 @@ def create_sample_data():
                 file_type=data['file_type'],
                 file_path=file_path,
                 tags=data['tags'],
+                created_at=created_at,
                 file_size=1024,
                 click_count=data['click_count']
             )
             db.session.add(media)
+            for tag in data['tags'].split(','):
+                db.session.add(MediaTag(media_id=file_id, tag=tag, created_at=created_at))
             print(f'创建: {data["original_filename"]} (点击数: {data["click_count"]})')
         
         db.session.commit()
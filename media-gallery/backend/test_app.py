@@ -7,12 +7,15 @@ from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from media_serializer import MEDIA_FIELDS, MediaSerializer, json_response
 
 app = Flask(__name__)
 CORS(app)  # 启用CORS支持
 app.config['UPLOAD_FOLDER'] = 'C:/agent/media-gallery/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov', 'wmv'}
 
+media_serializer = MediaSerializer({name: name for name in MEDIA_FIELDS})
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -31,29 +34,21 @@ def get_media():
     cursor = conn.cursor()
     
     try:
-        cursor.execute('SELECT * FROM media ORDER BY created_at DESC LIMIT 20')
+        fields = media_serializer.parse_fields(request.args.get('fields', ''))
+        columns = ', '.join(media_serializer.select_columns(fields))
+        cursor.execute(f'SELECT {columns} FROM media ORDER BY created_at DESC LIMIT 20')
         media_items = cursor.fetchall()
         
-        result = []
-        for media in media_items:
-            result.append({
-                'id': media['id'],
-                'filename': media['filename'],
-                'original_filename': media['original_filename'],
-                'file_type': media['file_type'],
-                'file_path': media['file_path'],
-                'tags': media['tags'],
-                'created_at': media['created_at'],
-                'file_size': media['file_size'],
-                'click_count': media['click_count']
-            })
+        result = media_serializer.to_dicts(media_items, fields)
         
-        return jsonify({
+        return json_response(app.response_class, {
             'media': result,
             'total': len(result),
             'pages': 1,
             'current_page': 1
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+查询计划回归测试：在generate_catalog.py生成的种子数据库上执行各种目录查询，
+记录每个请求或维护操作实际执行的SQL，检查：
+
+- EXPLAIN QUERY PLAN中没有全表扫描（不带索引的SCAN），ORDER BY/GROUP BY不使用临时B树；
+  确实需要扫描或排序的查询在用例中逐条列出允许的计划行
+- 每个请求的SQL语句数不超过上限，且不随per_page增长（发现N+1查询）
+
+用法:
+    python -m unittest test_query_plans -v
+    python test_query_plans.py
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import re
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from urllib.parse import quote
+
+# app.py导入时读取配置，必须先指向临时数据库
+WORK_DIR = tempfile.mkdtemp(prefix='query-plans-')
+DB_PATH = os.path.join(WORK_DIR, 'catalog.db')
+SETTINGS_PATH = os.path.join(WORK_DIR, 'settings.py')
+with open(SETTINGS_PATH, 'w', encoding='utf-8') as f:
+    f.write(f"SQLALCHEMY_DATABASE_URI = {'sqlite:///' + DB_PATH!r}\n")
+    f.write(f"UPLOAD_FOLDER = {os.path.join(WORK_DIR, 'uploads')!r}\n")
+    f.write(f"CATALOG_VERSION_DIR = {os.path.join(WORK_DIR, 'catalog_version')!r}\n")
+    f.write("TRACING_ENABLED = False\n")
+    f.write("METRICS_ENABLED = False\n")
+    f.write("RESPONSE_CACHE_SIZE = 0\n")  # 每个请求都实际查询数据库
+    f.write("HOT_SCORE_INTERVAL = 0\n")
+    f.write("CLICK_FLUSH_INTERVAL = 3600\n")  # 点击计数不在测试过程中自动写库，以免计入其他请求的语句数
+    f.write("CLICK_FLUSH_THRESHOLD = 1000000\n")
+os.environ['MEDIA_GALLERY_SETTINGS'] = SETTINGS_PATH
+
+from sqlalchemy import event
+from app import (app, db, Media, click_buffer, enqueue_job, flush_click_counts, rebuild_tag_stats,
+                 refresh_hot_scores)
+from generate_catalog import generate_catalog
+import worker
+
+CATALOG_SIZE = 5000
+CATALOG_SEED = 7
+
+# 不带USING INDEX的SCAN即全表扫描；"SCAN 50 CONSTANT ROWS"、虚拟表扫描等不匹配
+FULL_SCAN = re.compile(r'^SCAN \w+(?: AS \w+)?$')
+PLANNED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+ORDER_BY_SORT = {'USE TEMP B-TREE FOR ORDER BY'}
+
+# (URL, 最多SQL语句数, 允许出现的计划行)；URL中的占位符在setUpModule中按种子数据填入
+ENDPOINT_CASES = [
+    ('/api/media?per_page=20', 2, ()),
+    ('/api/media?page=5&per_page=20', 2, ()),
+    ('/api/media?after=&per_page=20', 1, ()),
+    ('/api/media?after={cursor}&per_page=20', 1, ()),
+    ('/api/media?after=&per_page=20&with_total=1', 2, ()),
+    ('/api/media?after=&per_page=20&type=video', 1, ()),
+    ('/api/media?after=&per_page=20&stream=ndjson', 1, ()),
+    ('/api/media?after=&per_page=20&tag={tag}', 1, ()),
+    ('/api/media?after={tag_cursor}&per_page=20&tag={tag}', 1, ()),
+    ('/api/media?page=2&per_page=20&tag={tag}', 2, ()),
+    ('/api/media?after=&per_page=20&sort=hot', 1, ()),
+    ('/api/media?after={hot_cursor}&per_page=20&sort=hot', 1, ()),
+    ('/api/media?after=&per_page=20&sort=popular', 1, ()),
+    ('/api/media?after=&per_page=20&sort=largest', 1, ()),
+    # 标签筛选时各种排序都按media_tag上的(tag, 排序列, media_id)索引顺序读取
+    ('/api/media?after=&per_page=20&sort=hot&tag={tag}', 1, ()),
+    ('/api/media?after={tag_hot_cursor}&per_page=20&sort=hot&tag={tag}', 1, ()),
+    ('/api/media?after=&per_page=20&sort=popular&tag={tag}', 1, ()),
+    ('/api/media?after=&per_page=20&sort=largest&tag={tag}', 1, ()),
+    ('/api/media/{media_id}', 1, ()),
+    ('/api/media/batch?ids={media_ids}', 1, ()),
+    ('/api/tags', 1, ()),
+    # 统计接口整表聚合，结果按stats版本号缓存，只在上传或删除后重新计算
+    ('/api/stats', 5, {'SCAN media', 'SCAN blob', 'SCAN media_tag', 'USE TEMP B-TREE FOR GROUP BY',
+                       'USE TEMP B-TREE FOR ORDER BY', 'USE TEMP B-TREE FOR count(DISTINCT)'}),
+    # 搜索按bm25相关度排序；不足3个字符的词无法使用trigram索引，按点击数索引顺序扫描并过滤
+    ('/api/search?q={long_term}', 1, ORDER_BY_SORT),
+    ('/api/search?q={short_term}', 1, ()),
+    ('/api/search?q={short_term}&type=video&page=2', 1, ()),
+]
+
+# 分别用两种per_page请求，语句数必须相同
+PAGE_SIZE_CASES = [
+    '/api/media?per_page={per_page}',
+    '/api/media?after=&per_page={per_page}&tag={tag}',
+    '/api/media?after=&per_page={per_page}&stream=json',
+    '/api/search?q={long_term}&per_page={per_page}',
+]
+
+params = {}
+
+def setUpModule():
+    generate_catalog(DB_PATH, app.config['UPLOAD_FOLDER'], CATALOG_SIZE, seed=CATALOG_SEED,
+                     images=2, videos=1, processes=1)
+    conn = sqlite3.connect(DB_PATH)
+    tag = conn.execute('SELECT tag FROM tag_stats ORDER BY count DESC LIMIT 1 OFFSET 5').fetchone()[0]
+    media_id, created_at, hot_score = conn.execute(
+        'SELECT id, created_at, hot_score FROM media WHERE hot_score > 0 ORDER BY rowid LIMIT 1 OFFSET 20').fetchone()
+    tag_media_id, tag_created_at, tag_hot_score = conn.execute(
+        'SELECT media_id, created_at, hot_score FROM media_tag WHERE tag = ? LIMIT 1 OFFSET 20', (tag,)).fetchone()
+    media_ids = [row[0] for row in conn.execute('SELECT id FROM media ORDER BY rowid LIMIT 50')]
+    conn.close()
+    params.update({
+        'tag': quote(tag),
+        'cursor': quote(f"{datetime.fromisoformat(created_at).isoformat()},{media_id}"),
+        'tag_cursor': quote(f"{datetime.fromisoformat(tag_created_at).isoformat()},{tag_media_id}"),
+        'hot_cursor': quote(f"{hot_score},{media_id}"),
+        'tag_hot_cursor': quote(f"{tag_hot_score},{tag_media_id}"),
+        'media_id': media_id,
+        'media_ids': ','.join(media_ids),
+        'long_term': quote('标签12'),
+        'short_term': quote('风景'),
+    })
+
+def tearDownModule():
+    click_buffer.flush()
+    with app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+class StatementRecorder:
+    """记录with块内（包括写线程中）执行的SQL语句及参数"""
+
+    def __init__(self, engine):
+        self.statements = None
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.statements is not None:
+            self.statements.append((statement, parameters[0] if executemany and parameters else parameters))
+
+    def __enter__(self):
+        self.statements = []
+        return self.statements
+
+    def __exit__(self, *exc):
+        self.statements = None
+        return False
+
+class QueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with app.app_context():
+            cls.recorder = StatementRecorder(db.engine)
+        cls.client = app.test_client()
+        cls.conn = sqlite3.connect(DB_PATH)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def query_plan(self, statement, parameters):
+        return [row[3] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())]
+
+    def assertPlansUseIndexes(self, statements, allowed=()):
+        for statement, parameters in statements:
+            if statement.lstrip().split(None, 1)[0].upper() not in PLANNED_STATEMENTS:
+                continue
+            plan = self.query_plan(statement, parameters)
+            problems = [
+                line for line in plan
+                if (FULL_SCAN.match(line) or line.startswith('USE TEMP B-TREE')) and line not in allowed
+            ]
+            self.assertFalse(problems, f"\n{statement}\n计划: {' | '.join(plan)}")
+
+    def assertStatementCount(self, statements, max_statements):
+        listing = '\n'.join(statement for statement, _ in statements)
+        self.assertLessEqual(len(statements), max_statements, f"SQL语句过多:\n{listing}")
+
+    def get(self, url):
+        with self.recorder as statements:
+            response = self.client.get(url)
+            response.get_data()  # 流式响应在读取响应体时才查询
+        self.assertEqual(response.status_code, 200, url)
+        return statements
+
+    def run_maintenance(self, func, *args):
+        with app.app_context(), self.recorder as statements:
+            func(*args)
+            db.session.commit()
+        return statements
+
+    def test_endpoint_query_plans(self):
+        for url, max_statements, allowed in ENDPOINT_CASES:
+            url = url.format(**params)
+            with self.subTest(url=url):
+                statements = self.get(url)
+                self.assertStatementCount(statements, max_statements)
+                self.assertPlansUseIndexes(statements, allowed)
+
+    def test_statement_count_independent_of_page_size(self):
+        for url in PAGE_SIZE_CASES:
+            with self.subTest(url=url):
+                small = self.get(url.format(per_page=5, **params))
+                large = self.get(url.format(per_page=100, **params))
+                self.assertEqual(len(small), len(large))
+
+    def test_click_flush(self):
+        conn = sqlite3.connect(DB_PATH)
+        ids = [row[0] for row in conn.execute('SELECT id FROM media ORDER BY rowid LIMIT 200')]
+        conn.close()
+        few = self.run_maintenance(flush_click_counts, {media_id: 2 for media_id in ids[:5]})
+        many = self.run_maintenance(flush_click_counts, {media_id: 1 for media_id in ids})
+        self.assertEqual(len(few), len(many))
+        self.assertPlansUseIndexes(many)
+        self.assertMediaTagInSync()
+
+    def test_hot_score_refresh(self):
+        statements = self.run_maintenance(refresh_hot_scores)
+        # 按media_id聚合的查询、清理、media和media_tag各一条归零及批量UPDATE
+        self.assertStatementCount(statements, 6)
+        self.assertPlansUseIndexes(statements)
+        self.assertMediaTagInSync()
+
+    def assertMediaTagInSync(self):
+        conn = sqlite3.connect(DB_PATH)
+        mismatched = conn.execute('''
+            SELECT COUNT(*) FROM media_tag JOIN media ON media.id = media_tag.media_id
+            WHERE media_tag.hot_score != media.hot_score OR media_tag.click_count != media.click_count
+               OR media_tag.file_size != media.file_size
+        ''').fetchone()[0]
+        conn.close()
+        self.assertEqual(mismatched, 0)
+
+    def test_rebuild_tag_stats(self):
+        statements = self.run_maintenance(rebuild_tag_stats)
+        self.assertStatementCount(statements, 3)
+        self.assertPlansUseIndexes(statements)
+
+    def test_dedupe_legacy_lookup(self):
+        # dedupe_uploads.py按sha256为空查找旧记录
+        statements = self.run_maintenance(lambda: Media.query.filter(Media.sha256.is_(None)).all())
+        self.assertPlansUseIndexes(statements)
+
+    def test_worker_thumbnails(self):
+        conn = sqlite3.connect(DB_PATH)
+        media_id = conn.execute("SELECT id FROM media WHERE file_type = 'image' LIMIT 1").fetchone()[0]
+        conn.close()
+        statements = self.run_maintenance(worker.handle_thumbnails, {'media_id': media_id})
+        self.assertPlansUseIndexes(statements)
+
+    def test_worker_claim(self):
+        self.run_maintenance(enqueue_job, 'verify_blob', {'sha256': '0' * 64})
+        statements = self.run_maintenance(worker.claim_job, 'query-plan-test')
+        self.assertStatementCount(statements, 1)
+        # 可领取的任务按优先级排序，排序行数受队列深度限制
+        self.assertPlansUseIndexes(statements, ORDER_BY_SORT)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+上传和文件访问的回归测试：在临时数据库和上传目录上执行普通上传、断点续传和/uploads/文件访问
+
+用法:
+    python -m unittest test_uploads -v
+    python test_uploads.py
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import io
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# app.py导入时读取配置，必须先指向临时数据库
+WORK_DIR = tempfile.mkdtemp(prefix='uploads-test-')
+DB_PATH = os.path.join(WORK_DIR, 'gallery.db')
+SETTINGS_PATH = os.path.join(WORK_DIR, 'settings.py')
+with open(SETTINGS_PATH, 'w', encoding='utf-8') as f:
+    f.write(f"SQLALCHEMY_DATABASE_URI = {'sqlite:///' + DB_PATH!r}\n")
+    f.write(f"UPLOAD_FOLDER = {os.path.join(WORK_DIR, 'uploads')!r}\n")
+    f.write(f"CATALOG_VERSION_DIR = {os.path.join(WORK_DIR, 'catalog_version')!r}\n")
+    f.write("TRACING_ENABLED = False\n")
+    f.write("METRICS_ENABLED = False\n")
+    f.write("HOT_SCORE_INTERVAL = 0\n")
+    f.write("UPLOAD_CLEANUP_INTERVAL = 0\n")
+    f.write("JOB_QUEUE_ENABLED = True\n")  # 缩略图写入job表，不在测试进程中后台生成
+os.environ['MEDIA_GALLERY_SETTINGS'] = SETTINGS_PATH
+
+import app as gallery
+from app import app, db, db_writer, Admin, Blob, Media, click_buffer, remove_media_files, upload_part_path
+
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD = 'test-password'
+
+def setUpModule():
+    with app.app_context():
+        db.create_all()
+        admin = Admin(username=ADMIN_USERNAME)
+        admin.set_password(ADMIN_PASSWORD)
+        db.session.add(admin)
+        db.session.commit()
+
+def tearDownModule():
+    click_buffer.flush()
+    with app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+def png_bytes(color=(0, 0, 0)):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def upload(client, data, filename='photo.png', tags='测试'):
+    return client.post('/api/upload', data={'file': (io.BytesIO(data), filename), 'tags': tags},
+                       content_type='multipart/form-data')
+
+class ResumableUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def create_session(self, data=b'secret part data'):
+        response = self.client.post('/api/uploads', json={'filename': 'clip.mp4', 'size': len(data) * 2})
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.get_json()['upload_id']
+        response = self.client.put(f'/api/uploads/{upload_id}?offset=0', data=data)
+        self.assertEqual(response.status_code, 200)
+        return upload_id
+
+    def test_part_files_not_served(self):
+        upload_id = self.create_session()
+        self.assertTrue(os.path.isfile(upload_part_path(upload_id)))
+        for url in (
+            f'/uploads/tmp/{upload_id}.part',
+            f'/uploads/images/../tmp/{upload_id}.part',
+            f'/uploads/./tmp/{upload_id}.part',
+            f'/uploads/images/%2e%2e/tmp/{upload_id}.part',
+            f'/uploads/images/%2E%2E/tmp/{upload_id}.part',
+            f'/uploads/videos/../images/../tmp/{upload_id}.part',
+            f'/uploads/tmp//{upload_id}.part',
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertNotIn(b'secret', response.get_data())
+
+    def test_missing_part_file(self):
+        # 会话记录还在但临时文件已被清理时，查询、续传和完成都和会话不存在一样返回404
+        data = b'part data'
+        upload_id = self.create_session(data)
+        os.remove(upload_part_path(upload_id))
+        for method, url in (
+            ('get', f'/api/uploads/{upload_id}'),
+            ('put', f'/api/uploads/{upload_id}?offset={len(data)}'),
+            ('post', f'/api/uploads/{upload_id}/complete'),
+        ):
+            with self.subTest(method=method, url=url):
+                response = getattr(self.client, method)(url, data=data if method == 'put' else None)
+                self.assertEqual(response.status_code, 404)
+        self.assertFalse(os.path.exists(upload_part_path(upload_id)))
+
+    def test_media_files_served(self):
+        data = png_bytes((1, 2, 3))
+        response = upload(self.client, data)
+        self.assertEqual(response.status_code, 201)
+        media = response.get_json()
+        media = media.get('media', media)
+        for url in (f"/uploads/images/{media['filename']}", f"/uploads/tmp/../images/{media['filename']}"):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get_data(), data)
+
+class BlobReferenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        response = self.client.post('/api/admin/login', json={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+        self.assertEqual(response.status_code, 200)
+
+    def upload(self, data):
+        response = upload(self.client, data)
+        self.assertEqual(response.status_code, 201)
+        media = response.get_json()
+        return media.get('media', media)
+
+    def blob(self, sha256):
+        with app.app_context():
+            blob = db.session.get(Blob, sha256)
+            return blob and (blob.ref_count, blob.file_path)
+
+    def test_last_reference_deleted_after_hash(self):
+        # 请求线程计算哈希时内容块还在（不写临时文件），写线程入库前最后一个引用被删除
+        data = png_bytes((10, 20, 30))
+        first = self.upload(data)
+        real_store_upload = gallery.store_upload
+        
+        def store_then_delete(file):
+            stored = real_store_upload(file)
+            self.assertIsNone(stored[2])
+            response = self.client.delete(f"/api/admin/media/{first['id']}")
+            self.assertEqual(response.status_code, 200)
+            return stored
+        
+        with mock.patch.object(gallery, 'store_upload', store_then_delete):
+            second = self.upload(data)
+        
+        with app.app_context():
+            media = db.session.get(Media, second['id'])
+            ref_count, file_path = self.blob(media.sha256)
+        self.assertEqual(ref_count, 1)
+        self.assertEqual(file_path, media.file_path)
+        response = self.client.get(f"/uploads/images/{media.filename}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), data)
+
+    def test_released_file_kept_when_reacquired(self):
+        # 删除提交之后、删除文件之前相同内容被重新上传，文件必须保留
+        data = png_bytes((40, 50, 60))
+        media = self.upload(data)
+        with app.app_context():
+            sha256 = db.session.get(Media, media['id']).sha256
+        db_writer.run(remove_media_files, [(media['filename'], media['file_path'], sha256)])
+        self.assertTrue(os.path.exists(media['file_path']))
+        
+        response = self.client.delete(f"/api/admin/media/{media['id']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(media['file_path']))
+        self.assertIsNone(self.blob(sha256))
+
+    def test_missing_blob_file_replaced(self):
+        # 内容块记录还在但文件丢失时，新上传放回记录中的路径
+        data = png_bytes((70, 80, 90))
+        first = self.upload(data)
+        os.remove(first['file_path'])
+        second = self.upload(data)
+        self.assertEqual(second['file_path'], first['file_path'])
+        with open(first['file_path'], 'rb') as f:
+            self.assertEqual(f.read(), data)
+        with app.app_context():
+            sha256 = db.session.get(Media, second['id']).sha256
+        self.assertEqual(self.blob(sha256), (2, first['file_path']))
+
+    def test_upload_temp_files_removed(self):
+        self.upload(png_bytes((100, 110, 120)))
+        tmp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'tmp')
+        self.assertEqual([name for name in os.listdir(tmp_dir) if name.endswith('.upload')], [])
+
+class BulkUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        response = self.client.post('/api/admin/login', json={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+        self.assertEqual(response.status_code, 200)
+
+    def bulk_body(self, files, boundary='bulk-test-boundary'):
+        body = f'--{boundary}\r\nContent-Disposition: form-data; name="tags"\r\n\r\n测试\r\n'.encode('utf-8')
+        for filename, data in files:
+            body += (f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+                     f'Content-Type: image/png\r\n\r\n').encode('utf-8') + data + b'\r\n'
+        return body + f'--{boundary}--\r\n'.encode('utf-8'), f'multipart/form-data; boundary={boundary}'
+
+    def post_bulk(self, body, content_type):
+        return self.client.post('/api/admin/upload/bulk', data=body, content_type=content_type)
+
+    def test_bulk_upload(self):
+        body, content_type = self.bulk_body([('a.png', png_bytes((1, 1, 1))), ('b.png', png_bytes((2, 2, 2)))])
+        response = self.post_bulk(body, content_type)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['uploaded'], 2)
+
+    def test_truncated_body_rejected(self):
+        # 请求体在结束边界之前中断：截断在文件内容中间、或恰好在某个部分结束之后，都不能把不完整的文件入库
+        data = png_bytes((3, 3, 3))
+        body, content_type = self.bulk_body([('c.png', data), ('d.png', png_bytes((4, 4, 4)))])
+        complete_part = body.index(b'--bulk-test-boundary', body.index(data))
+        with app.app_context():
+            count = Media.query.count()
+        for truncated in (body[:body.index(data) + len(data) // 2], body[:complete_part], body[:-len(b'--\r\n')]):
+            with self.subTest(size=len(truncated)):
+                response = self.post_bulk(truncated, content_type)
+                self.assertEqual(response.status_code, 400)
+                with app.app_context():
+                    self.assertEqual(Media.query.count(), count)
+                tmp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'tmp')
+                self.assertEqual([name for name in os.listdir(tmp_dir) if name.endswith('.part')], [])
+
+if __name__ == '__main__':
+    unittest.main()
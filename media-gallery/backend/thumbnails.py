@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import os
+from PIL import Image, ImageOps
+
+# 缩略图边长（像素），每个尺寸同时生成WebP和JPEG
+THUMBNAIL_SIZES = (256, 512, 1024)
+THUMBNAIL_FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+THUMBNAIL_QUALITY = 80
+
+def thumbnail_name(filename, size, ext='webp'):
+    """缩略图相对上传目录的路径：thumbnails/<size>/<原文件名去扩展名>.<ext>"""
+    stem = os.path.splitext(filename)[0]
+    return f"thumbnails/{size}/{stem}.{ext}"
+
+def thumbnails_exist(upload_folder, filename):
+    for size in THUMBNAIL_SIZES:
+        for ext, _ in THUMBNAIL_FORMATS:
+            if not os.path.exists(os.path.join(upload_folder, thumbnail_name(filename, size, ext))):
+                return False
+    return True
+
+def generate_thumbnails(source_path, upload_folder, filename):
+    """为一张图片生成全部尺寸的缩略图，在进程池中执行，返回生成的相对路径列表"""
+    generated = []
+    with Image.open(source_path) as img:
+        # GIF等多帧图片只取第一帧，按EXIF方向摆正
+        img.seek(0)
+        img = ImageOps.exif_transpose(img).convert('RGB')
+
+        for size in THUMBNAIL_SIZES:
+            thumb = img.copy()
+            thumb.thumbnail((size, size), Image.LANCZOS)
+            for ext, image_format in THUMBNAIL_FORMATS:
+                relative_path = thumbnail_name(filename, size, ext)
+                target_path = os.path.join(upload_folder, relative_path)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                # 先写临时文件再替换，避免请求读到写了一半的缩略图
+                tmp_path = f"{target_path}.tmp"
+                thumb.save(tmp_path, image_format, quality=THUMBNAIL_QUALITY)
+                os.replace(tmp_path, target_path)
+                generated.append(relative_path)
+    return generated
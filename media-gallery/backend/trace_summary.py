@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+统计span文件中各span名称的耗时分位数，判断上传、删除、列表和文件访问中哪个阶段最慢
+
+用法:
+    python trace_summary.py                          # 读取instance/traces/下所有进程的span文件及其轮转文件
+    python trace_summary.py path/to/spans.jsonl
+    python trace_summary.py --prefix upload.         # 只统计名称以upload.开头的span
+    python trace_summary.py --trace <trace_id>       # 按层级打印单个trace的所有span
+"""
+import argparse
+import glob
+import json
+import os
+
+# 默认TRACE_FILE为spans-{pid}.jsonl，每个进程一个文件
+DEFAULT_TRACE_PATTERN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'traces', 'spans*.jsonl*')
+
+def read_spans(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # 进程被杀时可能留下半行
+
+def percentile(sorted_values, p):
+    """最近秩法分位数"""
+    index = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+def summarize(spans, prefix=''):
+    durations = {}
+    for span in spans:
+        if span['name'].startswith(prefix):
+            durations.setdefault(span['name'], []).append(span['duration_ms'])
+
+    rows = []
+    for name, values in durations.items():
+        values.sort()
+        rows.append({
+            'name': name,
+            'count': len(values),
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': values[-1],
+            'total': sum(values)
+        })
+    rows.sort(key=lambda row: row['total'], reverse=True)
+    return rows
+
+def print_summary(rows):
+    print(f"{'span':<28}{'count':>8}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'max ms':>11}{'total ms':>13}")
+    for row in rows:
+        print(f"{row['name']:<28}{row['count']:>8}{row['p50']:>11.2f}{row['p95']:>11.2f}"
+              f"{row['p99']:>11.2f}{row['max']:>11.2f}{row['total']:>13.1f}")
+
+def print_trace(spans, trace_id):
+    spans = [span for span in spans if span['trace_id'] == trace_id]
+    if not spans:
+        print(f"未找到trace: {trace_id}")
+        return
+    ids = {span['span_id'] for span in spans}
+    children = {}
+    for span in spans:
+        parent = span['parent_id'] if span['parent_id'] in ids else None
+        children.setdefault(parent, []).append(span)
+
+    def walk(parent, depth):
+        for span in sorted(children.get(parent, []), key=lambda item: item['start']):
+            attrs = ' '.join(f"{key}={value}" for key, value in span['attrs'].items())
+            print(f"{'  ' * depth}{span['name']:<{40 - 2 * depth}}{span['duration_ms']:>10.2f} ms  {attrs}")
+            walk(span['span_id'], depth + 1)
+    walk(None, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description='统计span耗时分位数')
+    parser.add_argument('files', nargs='*', help=f'span文件，默认{DEFAULT_TRACE_PATTERN}')
+    parser.add_argument('--prefix', default='', help='只统计名称以该前缀开头的span')
+    parser.add_argument('--trace', help='打印单个trace的span树')
+    args = parser.parse_args()
+
+    paths = args.files or sorted(glob.glob(DEFAULT_TRACE_PATTERN))
+    if not paths:
+        print("没有span文件")
+        return
+
+    spans = list(read_spans(paths))
+    if args.trace:
+        print_trace(spans, args.trace)
+    else:
+        print_summary(summarize(spans, args.prefix))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+轻量级span追踪：每个请求一个trace，处理过程中的各阶段用嵌套span记录耗时，
+结束的span按行写入JSONL文件（按大小轮转），用trace_summary.py统计各阶段的分位数
+
+trace id兼容W3C traceparent请求头，也接受X-Trace-Id；当前span保存在contextvars中，
+只在创建它的线程内可见（交给写线程执行的操作不会产生子span）
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+_TRACE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+def _new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attrs', 'sampled', 'start_time', '_start')
+
+    def __init__(self, trace_id, parent_id, name, attrs, sampled):
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.sampled = sampled
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+class JsonlExporter:
+    """
+    把结束的span逐行写入JSONL文件，超过max_bytes时轮转，保留backup_count个旧文件
+
+    path中的{pid}替换为当前进程号：RotatingFileHandler的轮转不能跨进程，多个worker必须写不同的文件。
+    文件在进程第一次写入时才打开，fork出的子进程（如gunicorn --preload）会换成自己的文件
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._handler = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _current_handler(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    path = self.path.format(pid=pid)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    handler = RotatingFileHandler(path, maxBytes=self.max_bytes, backupCount=self.backup_count,
+                                                  encoding='utf-8', delay=True)
+                    handler.setFormatter(logging.Formatter('%(message)s'))
+                    self._handler, self._pid = handler, pid
+        return self._handler
+
+    def export(self, record):
+        self._current_handler().handle(logging.makeLogRecord({'msg': json.dumps(record, ensure_ascii=False)}))
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate=1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start_trace(self, name, traceparent=None, trace_id=None, **attrs):
+        """开始一个请求的根span并设为当前span；traceparent或trace_id有效时沿用调用方的trace id"""
+        parent_id = None
+        match = _TRACEPARENT.match(traceparent or '')
+        if match:
+            trace_id, parent_id = match.groups()
+        elif not _TRACE_ID.match(trace_id or ''):
+            trace_id = _new_id(16)
+        sampled = self.exporter is not None and random.random() < self.sample_rate
+        span = Span(trace_id, parent_id, name, attrs, sampled)
+        _current_span.set(span)
+        return span
+
+    def current(self):
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """当前span的子span；没有进行中的trace或未被抽样时不记录"""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            yield None
+            return
+        span = Span(parent.trace_id, parent.span_id, name, attrs, True)
+        _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.attrs['error'] = type(e).__name__
+            raise
+        finally:
+            _current_span.set(parent)
+            self._export(span)
+
+    def end_trace(self, span, **attrs):
+        """结束根span（可以在另一个上下文中调用，例如流式响应输出结束后）"""
+        span.attrs.update(attrs)
+        if _current_span.get() is span:
+            _current_span.set(None)
+        if span.sampled:
+            self._export(span)
+
+    def _export(self, span):
+        try:
+            self.exporter.export({
+                'trace_id': span.trace_id,
+                'span_id': span.span_id,
+                'parent_id': span.parent_id,
+                'name': span.name,
+                'start': round(span.start_time, 6),
+                'duration_ms': round((time.perf_counter() - span._start) * 1000, 3),
+                'thread': threading.current_thread().name,
+                'attrs': span.attrs
+            })
+        except Exception as e:
+            print(f"写入span失败: {e}")
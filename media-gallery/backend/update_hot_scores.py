@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db, refresh_hot_scores
+
+def main():
+    """根据click_bucket分时点击记录重新计算热度分，可由cron定时执行（此时可把HOT_SCORE_INTERVAL设为0）"""
+    
+    with app.app_context():
+        db.create_all()
+        try:
+            media_count = refresh_hot_scores()
+            print(f"热度分更新完成，{media_count} 个媒体在统计窗口内有点击")
+        except Exception as e:
+            print(f"更新热度分失败: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+后台任务worker：从job表领取并执行上传后的处理任务（缩略图生成、文件完整性校验）
+需要在app.py中设置JOB_QUEUE_ENABLED = True，上传时才会把缩略图任务写入队列
+
+用法:
+    python worker.py                   # 启动2个worker进程
+    python worker.py --processes 4
+    python worker.py --once            # 处理完当前可执行的任务后退出
+    python worker.py --enqueue-verify  # 为所有内容块加入完整性校验任务
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import json
+import socket
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Process
+from sqlalchemy import text, bindparam
+
+from app import (app, db, Job, Media, Blob, catalog_version, enqueue_job, hash_stream,
+                 JOB_PRIORITY_LOW)
+from thumbnails import generate_thumbnails, thumbnails_exist
+
+POLL_INTERVAL = 1.0  # 队列为空时的轮询间隔（秒）
+RETRY_BASE_DELAY = 10  # 失败重试的基础延迟（秒），按2的幂次退避
+
+# 单条UPDATE ... RETURNING原子地领取优先级最高的可执行任务（需要SQLite 3.35+），
+# 多个worker进程并发领取不会拿到同一个任务
+CLAIM_SQL = text('''
+    UPDATE job
+    SET status = 'running', attempts = attempts + 1, available_at = :lease_until,
+        locked_by = :worker, updated_at = :now
+    WHERE id = (
+        SELECT id FROM job
+        WHERE status IN ('queued', 'running') AND available_at <= :now
+        ORDER BY priority DESC, id
+        LIMIT 1
+    )
+    RETURNING id, kind, payload, attempts, max_attempts
+''').bindparams(
+    bindparam('now', type_=db.DateTime),
+    bindparam('lease_until', type_=db.DateTime)
+)
+
+def handle_thumbnails(payload):
+    media = db.session.get(Media, payload['media_id'])
+    if media is None:
+        return  # 媒体已被删除
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+    if not thumbnails_exist(upload_folder, media.filename):
+        generate_thumbnails(media.file_path, upload_folder, media.filename)
+    # 共享同一内容文件的媒体按sha256索引一并标记；旧数据没有sha256时只标记本条
+    if media.sha256:
+        Media.query.filter_by(sha256=media.sha256).update({Media.has_thumbnails: True})
+    else:
+        Media.query.filter_by(id=media.id).update({Media.has_thumbnails: True})
+    db.session.commit()
+    catalog_version.bump('media')
+
+def handle_verify_blob(payload):
+    blob = db.session.get(Blob, payload['sha256'])
+    if blob is None:
+        return  # 内容块已被删除
+
+    with open(blob.file_path, 'rb') as f:
+        actual = hash_stream(f)
+    if actual != blob.sha256:
+        raise ValueError(f"文件内容与哈希不一致: {blob.file_path}")
+
+JOB_HANDLERS = {
+    'thumbnails': handle_thumbnails,
+    'verify_blob': handle_verify_blob,
+}
+
+def claim_job(worker_id):
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=app.config['JOB_VISIBILITY_TIMEOUT'])
+    row = db.session.execute(CLAIM_SQL, {'now': now, 'lease_until': lease_until, 'worker': worker_id}).first()
+    db.session.commit()
+    return row
+
+def finish_job(job_id, worker_id, **values):
+    """只更新仍由当前worker持有的任务，租约过期被他人领取后不再覆盖"""
+    values['updated_at'] = datetime.utcnow()
+    Job.query.filter_by(id=job_id, locked_by=worker_id).update(values)
+    db.session.commit()
+
+def execute_job(row, worker_id):
+    job_id, kind, payload, attempts, max_attempts = row
+    if attempts > max_attempts:
+        # 最后一次执行时worker失联，租约过期后被重新领取
+        finish_job(job_id, worker_id, status='failed', last_error='超过最大重试次数')
+        return
+
+    handler = JOB_HANDLERS.get(kind)
+    try:
+        if handler is None:
+            raise ValueError(f"未知任务类型: {kind}")
+        handler(json.loads(payload))
+    except Exception as e:
+        db.session.rollback()
+        print(f"[{worker_id}] 任务 {job_id} ({kind}) 第{attempts}次执行失败: {e}")
+        if attempts >= max_attempts:
+            finish_job(job_id, worker_id, status='failed', last_error=str(e))
+        else:
+            delay = RETRY_BASE_DELAY * 2 ** (attempts - 1)
+            finish_job(job_id, worker_id, status='queued', last_error=str(e),
+                       available_at=datetime.utcnow() + timedelta(seconds=delay))
+        return
+
+    finish_job(job_id, worker_id, status='done', last_error=None)
+
+def run_worker(once=False):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"worker {worker_id} 已启动")
+    with app.app_context():
+        while True:
+            row = claim_job(worker_id)
+            if row is None:
+                if once:
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+            execute_job(row, worker_id)
+
+def enqueue_verify_jobs():
+    with app.app_context():
+        count = 0
+        for (sha256,) in db.session.query(Blob.sha256):
+            enqueue_job('verify_blob', {'sha256': sha256}, priority=JOB_PRIORITY_LOW)
+            count += 1
+        db.session.commit()
+        print(f"已加入 {count} 个完整性校验任务")
+
+def main():
+    parser = argparse.ArgumentParser(description='媒体库后台任务worker')
+    parser.add_argument('--processes', type=int, default=2, help='worker进程数')
+    parser.add_argument('--once', action='store_true', help='队列为空时退出')
+    parser.add_argument('--enqueue-verify', action='store_true', help='为所有内容块加入完整性校验任务')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        # 子进程各自建立数据库连接，不继承父进程的连接
+        db.engine.dispose()
+
+    if args.enqueue_verify:
+        enqueue_verify_jobs()
+        return
+
+    workers = [Process(target=run_worker, args=(args.once,)) for _ in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+if __name__ == '__main__':
+    main()
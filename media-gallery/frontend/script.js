@@ -1,7 +1,10 @@
 class MediaGallery {
     constructor() {
         this.currentPage = 1;
+        this.nextCursor = '';
+        this.hasMore = true;
         this.currentTag = '';
+        this.searchQuery = '';
         this.currentType = 'all';
         this.isLoading = false;
         this.allMedia = [];
@@ -54,6 +57,14 @@ class MediaGallery {
             this.loadMedia();
         });
 
+        // 全文搜索：回车提交，清空后恢复普通列表
+        document.getElementById('searchInput').addEventListener('change', (e) => {
+            this.searchQuery = e.target.value.trim();
+            this.currentPage = 1;
+            this.allMedia = [];
+            this.loadMedia();
+        });
+
         // 滚动加载更多
         window.addEventListener('scroll', () => {
             if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 100) {
@@ -65,12 +76,25 @@ class MediaGallery {
     async loadMedia() {
         if (this.isLoading) return;
         
+        // 切换筛选条件后从第一页重新开始
+        if (this.currentPage === 1) {
+            this.nextCursor = '';
+            this.hasMore = true;
+        }
+        if (!this.hasMore) return;
+        
         this.isLoading = true;
         document.getElementById('loading').style.display = 'block';
 
         try {
+            if (this.searchQuery) {
+                await this.loadSearchResults();
+                return;
+            }
+
+            // 游标分页：每页耗时与页码无关
             const params = new URLSearchParams({
-                page: this.currentPage,
+                after: this.nextCursor,
                 per_page: 20
             });
 
@@ -90,6 +114,8 @@ class MediaGallery {
                 this.renderMedia();
                 this.currentPage++;
             }
+            this.nextCursor = data.next_cursor || '';
+            this.hasMore = Boolean(data.next_cursor);
         } catch (error) {
             console.error('加载媒体失败:', error);
             alert('加载媒体失败，请重试');
@@ -99,6 +125,27 @@ class MediaGallery {
         }
     }
 
+    async loadSearchResults() {
+        // 搜索结果按相关度排序，使用页码分页
+        const params = new URLSearchParams({
+            q: this.searchQuery,
+            page: this.currentPage,
+            per_page: 20
+        });
+
+        if (this.currentType && this.currentType !== 'all') {
+            params.append('type', this.currentType);
+        }
+
+        const response = await fetch(`http://localhost:5000/api/search?${params}`);
+        const data = await response.json();
+
+        this.allMedia = [...this.allMedia, ...data.media];
+        this.renderMedia();
+        this.currentPage++;
+        this.hasMore = data.has_more;
+    }
+
     async loadTags() {
         try {
             const response = await fetch('http://localhost:5000/api/tags');
@@ -238,7 +285,10 @@ class MediaGallery {
                 mediaElement = document.createElement('img');
                 // URL encode the filename to handle Chinese characters
                 const encodedFilename = encodeURIComponent(media.filename);
-                mediaElement.src = `http://localhost:5000/uploads/${media.file_type}s/${encodedFilename}`;
+                const originalUrl = `http://localhost:5000/uploads/${media.file_type}s/${encodedFilename}`;
+                // 网格优先加载512px缩略图，未生成时回退到原图
+                const thumbnail = media.thumbnails && media.thumbnails['512'];
+                mediaElement.src = thumbnail ? `http://localhost:5000${encodeURI(thumbnail)}` : originalUrl;
                 mediaElement.alt = media.original_filename;
                 mediaElement.loading = 'lazy'; // 懒加载
             } else if (media.file_type === 'video') {